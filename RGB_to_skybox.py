@@ -1,6 +1,71 @@
 import numpy as np
-from plyfile import PlyData, PlyElement
 import os
+import shutil
+import argparse
+import sys
+import time
+
+from ply_reader import element_layout, read_ply_header
+from profiling import NULL_PROFILE, enable_profiling, start_profile
+
+# 需要改写的颜色字段
+COLOR_FIELDS = ('f_dc_0', 'f_dc_1', 'f_dc_2')
+
+def open_template(skybox_template_path):
+    """
+    只解析一次模板天空球的PLY头部，返回模板信息字典:
+    path、vertex_offset（顶点区在文件中的偏移）、dtype（顶点记录类型）、count（顶点数）
+    ASCII 模板返回 path、ascii=True 和 count，改写时沿用 plyfile 读写
+    模板中没有 f_dc_0..2 字段时返回 None；不是PLY文件或没有 vertex 元素时抛出 ValueError
+    """
+    header = read_ply_header(skybox_template_path)
+    vertex = next((element for element in header['elements'] if element[0] == 'vertex'), None)
+    if vertex is None:
+        raise ValueError(f"{skybox_template_path} 中没有 vertex 元素")
+    if any(name not in [prop for prop, _ in vertex[2]] for name in COLOR_FIELDS):
+        return None
+    if header['format'] == 'ascii':
+        return {'path': skybox_template_path, 'ascii': True, 'count': vertex[1]}
+
+    offset, dtype, count = element_layout(header, ('vertex',))['vertex']
+    return {'path': skybox_template_path, 'vertex_offset': offset, 'dtype': dtype, 'count': count}
+
+def _recolor_ascii(template, output_path, rgb_color):
+    """ASCII 模板无法按记录原地改写，读入后用 plyfile 整体写出（保持 ASCII 格式和其他元素）"""
+    try:
+        from plyfile import PlyData
+    except ImportError:
+        raise ValueError("ASCII 格式的PLY模板需要安装 plyfile（pip install plyfile）") from None
+    plydata = PlyData.read(template['path'])
+    vertices = plydata['vertex'].data
+    for name, c in zip(COLOR_FIELDS, rgb_color):
+        vertices[name] = c / 255.0
+    plydata.write(output_path)
+
+def recolor_template(template, output_path, rgb_color, profile=NULL_PROFILE):
+    """
+    复制模板文件后，通过内存映射只改写每个顶点的 f_dc_0..2（跨步写入），不重新序列化
+    每种颜色的开销约等于一次文件复制
+    profile: 可选的分阶段计时（见 profiling），记录 copy 和 recolor 两个阶段
+    """
+    if template.get('ascii'):
+        _recolor_ascii(template, output_path, rgb_color)
+        profile.lap('recolor')
+        return
+
+    shutil.copyfile(template['path'], output_path)
+    profile.lap('copy')
+    if template['count'] == 0:
+        return
+
+    vertices = np.memmap(output_path, dtype=template['dtype'], mode='r+',
+                         offset=template['vertex_offset'], shape=(template['count'],))
+    # 将RGB值归一化到[0,1]范围，写入 f_dc_0, f_dc_1, f_dc_2（对应RGB）
+    for name, c in zip(COLOR_FIELDS, rgb_color):
+        vertices[name] = c / 255.0
+    vertices.flush()
+    del vertices
+    profile.lap('recolor')
 
 def create_solid_color_skybox(skybox_template_path, output_path, rgb_color):
     """
@@ -12,36 +77,75 @@ def create_solid_color_skybox(skybox_template_path, output_path, rgb_color):
     - rgb_color: (R, G, B) 元组，值范围为0-255
     """
     print(f"创建颜色为 RGB{rgb_color} 的天空球...")
+    profile = start_profile('recolor', input=skybox_template_path, color=list(rgb_color))
     
-    # 读取模板PLY文件
-    plydata = PlyData.read(skybox_template_path)
-    
-    # 复制原始顶点数据
-    vertex_data = plydata['vertex'].data.copy()
-    
-    # 将RGB值归一化到[0,1]范围
-    r, g, b = [c / 255.0 for c in rgb_color]
-    
-    # 更新所有点的f_dc_0, f_dc_1, f_dc_2字段（对应RGB）
-    if 'f_dc_0' in vertex_data.dtype.names and 'f_dc_1' in vertex_data.dtype.names and 'f_dc_2' in vertex_data.dtype.names:
-        vertex_data['f_dc_0'] = r  # R
-        vertex_data['f_dc_1'] = g  # G
-        vertex_data['f_dc_2'] = b  # B
-        print(f"已更新 f_dc_0, f_dc_1, f_dc_2 字段")
-    else:
-        print(f"警告: 找不到 f_dc_0, f_dc_1, f_dc_2 字段")
+    try:
+        template = open_template(skybox_template_path)
+        if template is None:
+            print(f"警告: 找不到 f_dc_0, f_dc_1, f_dc_2 字段")
+            return False
+        profile.lap('open_template')
+        
+        recolor_template(template, output_path, rgb_color, profile)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
         return False
-    
-    # 创建新的PLY元素
-    vertex_element = PlyElement.describe(vertex_data, 'vertex')
-    
-    # 创建并保存新的PLY文件
-    new_plydata = PlyData([vertex_element], text=plydata.text)
-    new_plydata.write(output_path)
+    profile.finish(points=template['count'], output=output_path)
+    print(f"已更新 f_dc_0, f_dc_1, f_dc_2 字段")
     
     print(f"已创建颜色为 RGB{rgb_color} 的天空球: {output_path}")
     return True
 
+def solid_color_output_path(output_dir, rgb_color):
+    """纯色天空球的输出文件名，例如 skybox_rgb_255_0_0.ply"""
+    color_str = f"rgb_{rgb_color[0]}_{rgb_color[1]}_{rgb_color[2]}"
+    return os.path.join(output_dir, f"skybox_{color_str}.ply")
+
+def read_color_file(colors_file):
+    """从文本文件读取颜色列表，每行一个颜色（格式同交互输入），忽略空行"""
+    with open(colors_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def batch_recolor(skybox_template_path, color_inputs, output_dir="solid_skyboxes"):
+    """
+    批量生成纯色天空球：模板头部只解析一次，每种颜色复制一次模板后原地改写颜色字段
+    返回 (成功数, 失败数)
+    """
+    try:
+        template = open_template(skybox_template_path)
+    except (OSError, ValueError) as e:
+        print(f"错误: 无法读取模板 {skybox_template_path}: {e}")
+        return 0, len(color_inputs)
+    if template is None:
+        print(f"错误: 模板 {skybox_template_path} 中找不到 f_dc_0, f_dc_1, f_dc_2 字段")
+        return 0, len(color_inputs)
+
+    os.makedirs(output_dir, exist_ok=True)
+    succeeded = failed = 0
+    start = time.perf_counter()
+    for rgb_input in color_inputs:
+        rgb_color = parse_rgb_input(rgb_input)
+        if rgb_color is None:
+            print(f"[失败] 无法识别的RGB格式: {rgb_input}")
+            failed += 1
+            continue
+        output_path = solid_color_output_path(output_dir, rgb_color)
+        profile = start_profile('recolor', input=skybox_template_path, color=list(rgb_color))
+        try:
+            recolor_template(template, output_path, rgb_color, profile)
+        except Exception as e:
+            print(f"[失败] RGB{rgb_color}: {e}")
+            failed += 1
+            continue
+        profile.finish(points=template['count'], output=output_path)
+        print(f"[成功] RGB{rgb_color} -> {output_path}")
+        succeeded += 1
+
+    elapsed = time.perf_counter() - start
+    rate = succeeded / elapsed if elapsed > 0 else 0.0
+    print(f"完成: 成功 {succeeded} 个，失败 {failed} 个，用时 {elapsed:.2f}s（{rate:.1f} 个/s）")
+    return succeeded, failed
+
 def parse_rgb_input(rgb_input):
     """解析用户输入的RGB值"""
     try:
@@ -52,13 +156,13 @@ def parse_rgb_input(rgb_input):
         if ',' in rgb_input:
             values = [int(x.strip()) for x in rgb_input.split(',')]
             if len(values) == 3:
-                return tuple(np.clip(values, 0, 255))
+                return tuple(int(v) for v in np.clip(values, 0, 255))
         
         # 格式2: "r g b"
         elif ' ' in rgb_input:
             values = [int(x.strip()) for x in rgb_input.split()]
             if len(values) == 3:
-                return tuple(np.clip(values, 0, 255))
+                return tuple(int(v) for v in np.clip(values, 0, 255))
         
         # 格式3: "#rrggbb" 或 "rrggbb" (十六进制)
         elif rgb_input.startswith('#') or all(c in '0123456789abcdefABCDEF' for c in rgb_input.replace('#', '')):
@@ -73,8 +177,8 @@ def parse_rgb_input(rgb_input):
     
     return None
 
-def main():
-    skybox_template_path = "skybox.ply"
+def interactive_main(skybox_template_path="skybox.ply"):
+    """交互模式：逐个输入颜色并生成纯色天空球"""
     
     # 检查模板文件是否存在
     if not os.path.exists(skybox_template_path):
@@ -106,8 +210,7 @@ def main():
         os.makedirs(output_dir, exist_ok=True)
         
         # 构建输出文件名
-        color_str = f"rgb_{rgb_color[0]}_{rgb_color[1]}_{rgb_color[2]}"
-        output_path = os.path.join(output_dir, f"skybox_{color_str}.ply")
+        output_path = solid_color_output_path(output_dir, rgb_color)
         
         # 创建纯色天空球
         success = create_solid_color_skybox(skybox_template_path, output_path, rgb_color)
@@ -121,5 +224,31 @@ def main():
         else:
             print("创建天空球失败，请检查错误信息")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="由模板天空球批量生成纯色天空球")
+    parser.add_argument("colors", nargs="*", help="颜色列表，如 '255,0,0' '#00FF00'；不提供颜色时进入交互模式")
+    parser.add_argument("-f", "--colors-file", help="颜色列表文件，每行一个颜色")
+    parser.add_argument("-t", "--template", default="skybox.ply", help="模板天空球PLY文件 (默认 skybox.ply)")
+    parser.add_argument("-o", "--output-dir", default="solid_skyboxes", help="输出目录 (默认 solid_skyboxes)")
+    parser.add_argument("--profile", help="记录各阶段耗时，每种颜色一行JSON写入该文件（'-' 为标准错误），也可以设置环境变量 SKYBOX_PROFILE")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    enable_profiling(args.profile)
+    color_inputs = list(args.colors)
+    if args.colors_file:
+        color_inputs.extend(read_color_file(args.colors_file))
+    if not color_inputs:
+        interactive_main(args.template)
+        return 0
+
+    if not os.path.exists(args.template):
+        print(f"错误: 找不到天空球模板文件 {args.template}")
+        return 1
+
+    _, failed = batch_recolor(args.template, color_inputs, args.output_dir)
+    return 1 if failed else 0
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+
+# R2 低差异序列的生成常数（平面上的黄金比例推广）
+_R2_PLASTIC = 1.32471795724474602596
+_R2_A1 = 1.0 / _R2_PLASTIC
+_R2_A2 = 1.0 / (_R2_PLASTIC * _R2_PLASTIC)
+
+def grid_statistics(pixels, grid_height):
+    """
+    把全景图按 grid_height x (2 * grid_height) 的经纬网格分块，逐个网格行读取并计算每格的亮度均值和方差
+    输入可以是内存映射；浮点HDR按 log(1 + 亮度) 计算
+    返回 (mean, variance)，形状均为 (grid_height, 2 * grid_height)
+    """
+    height, width = pixels.shape[:2]
+    grid_height = min(grid_height, height)
+    grid_width = min(2 * grid_height, width)
+    row_edges = np.linspace(0, height, grid_height + 1).astype(np.int64)
+    col_edges = np.linspace(0, width, grid_width + 1).astype(np.int64)
+    col_counts = np.diff(col_edges)
+
+    mean = np.empty((grid_height, grid_width))
+    mean_sq = np.empty((grid_height, grid_width))
+    for g in range(grid_height):
+        top, bottom = row_edges[g], row_edges[g + 1]
+        band = np.asarray(pixels[top:bottom, :, :3], dtype=np.float64)
+        luminance = band @ np.array([0.2126, 0.7152, 0.0722])
+        if pixels.dtype == np.uint8:
+            luminance /= 255.0
+        else:
+            luminance = np.log1p(np.maximum(luminance, 0.0))
+        count = (bottom - top) * col_counts
+        mean[g] = np.add.reduceat(luminance.sum(axis=0), col_edges[:-1]) / count
+        mean_sq[g] = np.add.reduceat((luminance * luminance).sum(axis=0), col_edges[:-1]) / count
+    return mean, np.maximum(mean_sq - mean * mean, 0.0)
+
+def detail_map(pixels, grid_height=256):
+    """
+    细节图：网格内的亮度标准差（格内细节）加上网格间的亮度梯度（边缘），归一化到 [0, 1]
+    经度方向循环处理
+    """
+    mean, variance = grid_statistics(pixels, grid_height)
+    grad_rows = np.gradient(mean, axis=0)
+    grad_cols = (np.roll(mean, -1, axis=1) - np.roll(mean, 1, axis=1)) / 2
+    detail = np.sqrt(variance) + np.hypot(grad_rows, grad_cols)
+    peak = detail.max()
+    return detail / peak if peak > 0 else detail
+
+def build_adaptive_layout(pixels, num_points, min_density=0.1, grid_height=256, seed=None):
+    """
+    根据细节图构建自适应采样布局
+    每个网格的点密度（每球面度点数）与 min_density + (1 - min_density) * 细节 成正比，
+    min_density 是平坦区域相对于最高密度的下限，保证覆盖不出现空洞
+    seed: 格内随机偏移的种子，None 时使用全局随机数
+    """
+    min_density = min(max(min_density, 1e-3), 1.0)
+    rng = np.random if seed is None else np.random.default_rng(seed)
+    detail = detail_map(pixels, grid_height)
+    grid_height, grid_width = detail.shape
+
+    # 网格行的极角边界：与 equirect_pixel_coords 一致，图像第0行对应 θ = π（y = -1）
+    theta_edges = np.pi * (1 - np.arange(grid_height + 1) / grid_height)
+    cos_edges = np.cos(theta_edges)
+    solid_angle = np.broadcast_to(((cos_edges[1:] - cos_edges[:-1]) * (2 * np.pi / grid_width))[:, None], detail.shape)
+
+    weight = min_density + (1 - min_density) * detail
+    mass = (weight * solid_angle).ravel()
+    cdf = np.concatenate(([0.0], np.cumsum(mass)))
+    cdf /= cdf[-1]
+
+    # 每格的点密度（每球面度点数）
+    density = (num_points * mass / mass.sum()).reshape(detail.shape) / solid_angle
+
+    # 中点分层：第 k 个点落在 u_k = (k + 0.5) / N，所在网格及格内序号都能按序号直接算出
+    first_index = np.ceil(cdf * num_points - 0.5).astype(np.int64)
+
+    return {
+        'grid_shape': detail.shape,
+        'cdf': cdf,
+        'first_index': first_index,
+        'cos_edges': cos_edges,
+        'density': density.ravel(),
+        'offsets': rng.random((detail.size, 2)),
+    }
+
+def adaptive_points(layout, num_points, radius, start=0, stop=None):
+    """
+    计算自适应布局中序号 [start, stop) 的点
+    格内位置使用 R2 低差异序列（每格随机偏移），按立体角均匀分布
+    返回 (位置 (n, 3) float64, 每个点所在网格的点密度 (n,))
+    """
+    stop = num_points if stop is None else stop
+    grid_height, grid_width = layout['grid_shape']
+    k = np.arange(start, stop)
+    u = (k + 0.5) / num_points
+    cell = np.minimum(np.searchsorted(layout['cdf'], u, side='right') - 1, grid_height * grid_width - 1)
+    rank = k - layout['first_index'][cell]
+
+    offsets = layout['offsets'][cell]
+    a = (offsets[:, 0] + rank * _R2_A1) % 1.0
+    b = (offsets[:, 1] + rank * _R2_A2) % 1.0
+
+    row, col = np.divmod(cell, grid_width)
+    phi = (col + a) * (2 * np.pi / grid_width)
+    cos_theta = layout['cos_edges'][row] + b * (layout['cos_edges'][row + 1] - layout['cos_edges'][row])
+    sin_theta = np.sqrt(np.maximum(1 - cos_theta * cos_theta, 0.0))
+
+    positions = np.column_stack((
+        np.cos(phi) * sin_theta * radius,
+        cos_theta * radius,
+        np.sin(phi) * sin_theta * radius,
+    ))
+    return positions, layout['density'][cell]
+
+def adaptive_savings(layout, num_points):
+    """
+    以自适应布局的最高密度为基准，计算均匀分布达到相同细节所需的点数
+    返回 (等效均匀点数, 节省比例)
+    """
+    equivalent = int(math.ceil(layout['density'].max() * 4 * math.pi))
+    return equivalent, max(0.0, 1 - num_points / equivalent)
@@ -0,0 +1,193 @@
+import glob
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from build_manifest import generator_id, params_digest
+
+def expand_inputs(patterns):
+    """展开输入的文件路径/通配符，去重并保持稳定顺序"""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            key = os.path.abspath(path)
+            if os.path.isfile(path) and key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+def output_path_for(input_path, suffix, output_dir=None):
+    """根据输入文件名生成输出路径，例如 a.jpg -> <output_dir>/a_skysphere.ply"""
+    stem = os.path.splitext(os.path.basename(input_path))[0] + suffix
+    directory = output_dir if output_dir else os.path.dirname(input_path)
+    return os.path.join(directory, stem)
+
+def _timed_call(func, input_path, output_path, args, kwargs):
+    """在工作进程中执行转换并返回耗时，保证异常原样传回主进程"""
+    start = time.perf_counter()
+    func(input_path, output_path, *args, **kwargs)
+    return time.perf_counter() - start
+
+def _incremental_plan(manifest, func, input_files, suffix, args, kwargs, output_dir):
+    """
+    增量模式：清理孤立输出，跳过输入、参数和输出都未变化的文件
+    返回 (需要生成的输入列表, 记录生成结果的函数 record(input_path, output_path))
+    """
+    generator = generator_id(func)
+    params = params_digest(func, suffix, args, kwargs)
+    outputs = {output_path_for(path, suffix, output_dir): path for path in input_files}
+    for output_path in manifest.prune(generator, outputs):
+        print(f"[清理] {output_path}（输入已删除或本次不再生成）")
+    todo = [path for path in input_files
+            if not manifest.is_current(path, output_path_for(path, suffix, output_dir), params)]
+    if len(todo) < len(input_files):
+        print(f"跳过 {len(input_files) - len(todo)} 个未变化的文件")
+    return todo, functools.partial(manifest.record, params=params, generator=generator)
+
+def run_batch(func, input_files, suffix, args=(), kwargs=None, output_dir=None, workers=None, max_in_flight=None,
+              manifest=None):
+    """
+    使用进程池并行转换多个文件
+
+    参数:
+    - func: 转换函数，调用方式为 func(input_path, output_path, *args, **kwargs)，必须可被pickle
+    - input_files: 输入文件列表
+    - suffix: 输出文件后缀，例如 "_skysphere.ply"
+    - args: 传给转换函数的其余位置参数
+    - kwargs: 传给转换函数的关键字参数
+    - output_dir: 输出目录，None 表示与输入文件同目录
+    - workers: 进程数，默认为CPU核数
+    - max_in_flight: 同时提交的最大任务数，限制驻留内存（默认等于进程数）
+    - manifest: 可选的 build_manifest.BuildManifest，给出时只重新生成过期的输出并清理孤立输出
+
+    返回 (成功数, 失败数)，跳过的文件不计入
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(1, max_in_flight or workers)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if manifest is not None:
+        input_files, record = _incremental_plan(manifest, func, input_files, suffix, args, kwargs, output_dir)
+
+    pending = {}
+    succeeded = failed = 0
+    total_bytes = 0
+    batch_start = time.perf_counter()
+    queue = iter(input_files)
+
+    print(f"使用 {workers} 个进程处理 {len(input_files)} 个文件（最多 {max_in_flight} 个任务同时进行）")
+
+    # 清单在结束或中断时保存，已完成的文件下次不会重新生成
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submit_next():
+                for input_path in queue:
+                    output_path = output_path_for(input_path, suffix, output_dir)
+                    future = executor.submit(_timed_call, func, input_path, output_path, tuple(args), kwargs or {})
+                    pending[future] = (input_path, output_path)
+                    return True
+                return False
+
+            while len(pending) < max_in_flight and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    input_path, output_path = pending.pop(future)
+                    try:
+                        elapsed = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"[失败] {input_path}: {e}")
+                    else:
+                        succeeded += 1
+                        size = os.path.getsize(output_path)
+                        total_bytes += size
+                        print(f"[成功] {input_path} -> {output_path} ({elapsed:.2f} 秒, {size / 1e6:.1f} MB)")
+                        if manifest is not None:
+                            record(input_path, output_path)
+                    submit_next()
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+    wall = time.perf_counter() - batch_start
+    print(f"完成: 成功 {succeeded} 个，失败 {failed} 个，总耗时 {wall:.2f} 秒")
+    if wall > 0:
+        print(f"吞吐量: {succeeded / wall:.2f} 文件/秒, {total_bytes / 1e6 / wall:.1f} MB/秒")
+    return succeeded, failed
+
+def run_pipelined(func, input_files, suffix, load, args=(), kwargs=None, output_dir=None, prefetch=2, manifest=None):
+    """
+    单进程流水线：后台线程预先读取/解码接下来的 prefetch 个输入，主线程生成当前文件
+    （写出由转换函数交给后台写线程，见 ply_writer.ThreadedWriter）
+    解码、采样、写出互相重叠，适合网络存储等I/O较慢的场合，总耗时接近各阶段中最慢者而不是它们的和
+
+    参数:
+    - func: 转换函数，调用方式为 func(input_path, output_path, *args, pixels=load(input_path), **kwargs)
+    - load: 读取输入的函数，在预读线程中执行（PIL 和 NumPy 的大部分解码/复制会释放GIL）
+    - prefetch: 预读的文件数，同时驻留内存的已解码图像最多为 prefetch + 1 个
+    其余参数同 run_batch（包括增量模式的 manifest）
+
+    返回 (成功数, 失败数)，跳过的文件不计入
+    """
+    prefetch = max(1, prefetch)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if manifest is not None:
+        input_files, record = _incremental_plan(manifest, func, input_files, suffix, args, kwargs, output_dir)
+
+    succeeded = failed = 0
+    total_bytes = 0
+    batch_start = time.perf_counter()
+    queue = iter(input_files)
+
+    print(f"流水线处理 {len(input_files)} 个文件（预读 {prefetch} 个）")
+
+    try:
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            loading = deque()
+
+            def submit_next():
+                for input_path in queue:
+                    loading.append((input_path, executor.submit(load, input_path)))
+                    return
+
+            for _ in range(prefetch):
+                submit_next()
+
+            while loading:
+                input_path, future = loading.popleft()
+                # 取出当前文件时再预读下一个，驻留的解码结果不超过 prefetch + 1 个
+                submit_next()
+                output_path = output_path_for(input_path, suffix, output_dir)
+                start = time.perf_counter()
+                try:
+                    pixels = future.result()
+                    func(input_path, output_path, *args, pixels=pixels, **(kwargs or {}))
+                except Exception as e:
+                    failed += 1
+                    print(f"[失败] {input_path}: {e}")
+                else:
+                    succeeded += 1
+                    size = os.path.getsize(output_path)
+                    total_bytes += size
+                    print(f"[成功] {input_path} -> {output_path} ({time.perf_counter() - start:.2f} 秒, {size / 1e6:.1f} MB)")
+                    if manifest is not None:
+                        record(input_path, output_path)
+                finally:
+                    pixels = None
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+    wall = time.perf_counter() - batch_start
+    print(f"完成: 成功 {succeeded} 个，失败 {failed} 个，总耗时 {wall:.2f} 秒")
+    if wall > 0:
+        print(f"吞吐量: {succeeded / wall:.2f} 文件/秒, {total_bytes / 1e6 / wall:.1f} MB/秒")
+    return succeeded, failed
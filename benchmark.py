@@ -0,0 +1,232 @@
+import numpy as np
+import os
+import json
+import time
+import platform
+import statistics
+import argparse
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from profiling import peak_rss_mb
+
+# 全景图宽度（高度为一半）与地面图边长的预设
+RESOLUTIONS = {'2k': 2048, '4k': 4096, '8k': 8192, '16k': 16384}
+
+# 预设测试矩阵：quick 用于日常快速比较，full 覆盖 2K-16K、1万-1000万点
+PRESETS = {
+    'quick': {'resolutions': ['2k'], 'points': [10000, 100000]},
+    'full': {'resolutions': ['2k', '4k', '8k', '16k'], 'points': [10000, 100000, 1000000, 10000000]},
+}
+
+# 测试阶段：天空球、地面、纯色重新着色
+STAGES = ('sky', 'ground', 'recolor')
+
+# 默认回归阈值：吞吐量下降或峰值内存上升超过 10% 视为回归
+DEFAULT_THRESHOLD = 0.10
+
+# 峰值内存的绝对波动容差（MB），小用例的进程基础内存本身有几十MB的波动
+MEMORY_NOISE_MB = 32
+
+# 耗时的绝对波动容差（秒），几毫秒的用例即使取中位数也有这个量级的抖动
+TIME_NOISE_S = 0.005
+
+# 每个用例默认的计时次数（另有一次不计时的预热）
+DEFAULT_REPEATS = 7
+
+def synthetic_image(path, width, height, band_rows=1024):
+    """生成带渐变和细节纹理的合成测试图像（按行带计算，已存在时直接复用）"""
+    if os.path.exists(path):
+        return path
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    u = np.linspace(0, 1, width, dtype=np.float32)
+    for top in range(0, height, band_rows):
+        v = np.linspace(top / height, min(top + band_rows, height) / height, min(band_rows, height - top),
+                        endpoint=False, dtype=np.float32)[:, None]
+        detail = 0.5 + 0.5 * np.sin(u * 397.0) * np.cos(v * 211.0)
+        pixels[top:top + band_rows, :, 0] = (255 * (0.6 * u + 0.4 * detail)).astype(np.uint8)
+        pixels[top:top + band_rows, :, 1] = (255 * (0.6 * v + 0.4 * detail)).astype(np.uint8)
+        pixels[top:top + band_rows, :, 2] = (255 * (0.6 * (1 - v) * u + 0.4 * (1 - detail))).astype(np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+# 校准负载的数组（长度固定），与用例交替计时
+_CALIBRATION_SIZE = 1 << 19
+
+def _calibration(data):
+    """固定的校准负载（排序、超越函数和求和），用于抵消机器负载和频率随时间的漂移"""
+    start = time.perf_counter()
+    np.sort(data)
+    np.sin(data).sum()
+    return time.perf_counter() - start
+
+def _run_case(stage, input_path, output_path, num_points, repeats=DEFAULT_REPEATS):
+    """
+    在独立进程中运行一个测试用例：先导入模块并预热一次（不计时），再计时 repeats 次
+    每次计时前运行一次校准负载，返回每次耗时、对应的校准耗时、输出大小和峰值内存
+    """
+    import contextlib
+    import io
+
+    if stage == 'sky':
+        from pano_to_skybox import generate_sky_sphere
+        run = lambda: generate_sky_sphere(input_path, output_path, num_points, 100.0)
+    elif stage == 'ground':
+        from photo_to_plane import generate_ground_plane
+        run = lambda: generate_ground_plane(input_path, output_path, num_points, 200.0)
+    else:
+        from RGB_to_skybox import create_solid_color_skybox
+        run = lambda: create_solid_color_skybox(input_path, output_path, (40, 120, 220))
+
+    data = np.random.default_rng(0).random(_CALIBRATION_SIZE)
+    walls, calibrations = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+        _calibration(data)
+        for _ in range(max(1, repeats)):
+            calibrations.append(_calibration(data))
+            start = time.perf_counter()
+            run()
+            walls.append(time.perf_counter() - start)
+    return {'walls': walls, 'calibrations': calibrations, 'output_bytes': os.path.getsize(output_path),
+            'peak_rss_mb': peak_rss_mb()}
+
+def run_benchmarks(work_dir, resolutions, points, stages=STAGES, image_format='jpg', keep_outputs=False,
+                   repeats=DEFAULT_REPEATS):
+    """
+    依次运行测试矩阵中的每个用例，每个用例使用新的进程（spawn），峰值内存互不影响
+    每个用例预热一次后计时 repeats 次，wall_s 及吞吐量取中位数（不受个别被打断的运行影响），同时给出最小值；
+    relative_cost 为每次耗时与紧邻的校准负载耗时之比的中位数，用于跨时间比较
+    返回结果列表，每条包含 case、stage、分辨率、点数、耗时、点/秒、MB/s、峰值内存
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for resolution in resolutions:
+        width = RESOLUTIONS[resolution]
+        pano = synthetic_image(os.path.join(work_dir, f"pano_{resolution}.{image_format}"), width, width // 2)
+        ground = synthetic_image(os.path.join(work_dir, f"ground_{resolution}.{image_format}"), width // 2, width // 2)
+
+        for num_points in points:
+            sky_output = os.path.join(work_dir, f"sky_{resolution}_{num_points}.ply")
+            cases = [
+                ('sky', pano, sky_output),
+                ('ground', ground, os.path.join(work_dir, f"ground_{resolution}_{num_points}.ply")),
+                ('recolor', sky_output, os.path.join(work_dir, f"recolor_{resolution}_{num_points}.ply")),
+            ]
+            for stage, input_path, output_path in cases:
+                if stage not in stages or (stage == 'recolor' and not os.path.exists(input_path)):
+                    continue
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    metrics = pool.submit(_run_case, stage, input_path, output_path, num_points, repeats).result()
+
+                wall = statistics.median(metrics['walls'])
+                peak = metrics['peak_rss_mb']
+                result = {
+                    'case': f"{stage}/{resolution}/{num_points}",
+                    'stage': stage,
+                    'resolution': resolution,
+                    'points': num_points,
+                    'repeats': len(metrics['walls']),
+                    'wall_s': round(wall, 5),
+                    'wall_min_s': round(min(metrics['walls']), 5),
+                    'relative_cost': round(statistics.median(w / c for w, c in zip(metrics['walls'], metrics['calibrations'])), 4),
+                    'points_per_s': round(num_points / wall, 1),
+                    'mb_per_s': round(metrics['output_bytes'] / 1024 ** 2 / wall, 2),
+                    'output_mb': round(metrics['output_bytes'] / 1024 ** 2, 2),
+                    'peak_rss_mb': round(peak, 1) if peak is not None else None,
+                }
+                results.append(result)
+                memory = f"{peak:.0f} MB" if peak is not None else "不可用"
+                print(f"{result['case']:<24} {wall:>9.4f}s（最小 {result['wall_min_s']:.4f}s） "
+                      f"{result['points_per_s']:>14,.0f} 点/s {result['mb_per_s']:>9.1f} MB/s  峰值内存 {memory}")
+
+        if not keep_outputs:
+            for name in os.listdir(work_dir):
+                if name.endswith('.ply'):
+                    os.remove(os.path.join(work_dir, name))
+    return results
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基准结果逐个用例比较，返回回归列表
+    速度按 relative_cost（相对校准负载的耗时，抵消机器状态的漂移）比较，基准中没有时按点/秒的中位数比较；
+    变慢超过 threshold 且耗时增加超过 TIME_NOISE_S，
+    或峰值内存高于基准的 (1 + threshold) 倍且增加超过 MEMORY_NOISE_MB，都视为回归
+    """
+    previous = {entry['case']: entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        old = previous.get(entry['case'])
+        if old is None:
+            continue
+        if 'relative_cost' in old:
+            speed = old['relative_cost'] / entry['relative_cost'] - 1
+        else:
+            speed = entry['points_per_s'] / old['points_per_s'] - 1
+        if speed < -threshold and entry['wall_s'] - old['wall_s'] > TIME_NOISE_S:
+            regressions.append(f"{entry['case']}: 吞吐量下降 {-speed:.1%}")
+        if entry['peak_rss_mb'] is None or old['peak_rss_mb'] is None:
+            print(f"{entry['case']:<24} 吞吐量 {speed:+.1%}")
+            continue
+        memory = entry['peak_rss_mb'] / old['peak_rss_mb'] - 1
+        print(f"{entry['case']:<24} 吞吐量 {speed:+.1%}  峰值内存 {memory:+.1%}")
+        if memory > threshold and entry['peak_rss_mb'] - old['peak_rss_mb'] > MEMORY_NOISE_MB:
+            regressions.append(f"{entry['case']}: 峰值内存上升 {memory:.1%}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="生成器和I/O路径的性能基准测试")
+    parser.add_argument("--preset", choices=PRESETS, default="quick", help="测试矩阵预设 (默认 quick)")
+    parser.add_argument("--resolutions", nargs="+", choices=RESOLUTIONS, help="覆盖预设的分辨率列表")
+    parser.add_argument("--points", nargs="+", type=int, help="覆盖预设的点数列表")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="要运行的阶段 (默认全部)")
+    parser.add_argument("--image-format", choices=("jpg", "png", "tif", "bmp"), default="jpg", help="合成图像的格式 (默认 jpg)")
+    parser.add_argument("--work-dir", default="benchmark_data", help="合成图像和临时输出目录 (默认 benchmark_data)")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help=f"每个用例的计时次数，另有一次预热 (默认 {DEFAULT_REPEATS})")
+    parser.add_argument("--keep-outputs", action="store_true", help="保留生成的PLY文件")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="结果文件 (默认 benchmark_results.json)")
+    parser.add_argument("--baseline", help="基准结果文件，提供时逐项比较并在出现回归时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回归阈值（比例，默认 0.10）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    preset = PRESETS[args.preset]
+    resolutions = args.resolutions or preset['resolutions']
+    points = args.points or preset['points']
+
+    results = run_benchmarks(args.work_dir, resolutions, points, args.stages, args.image_format, args.keep_outputs,
+                             args.repeats)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'image_format': args.image_format,
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print("检测到性能回归:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"未发现超过 {args.threshold:.0%} 的回归")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
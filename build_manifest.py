@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import time
+
+# 流式计算哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1 << 20
+
+# 不影响输出内容的关键字参数，不计入参数摘要（修改它们不会触发重新生成）
+VOLATILE_PARAMS = ('cache_dir', 'cache_max_bytes', 'raw_cache_dir', 'band_rows', 'chunk_size', 'write_queue', 'workers')
+
+def file_digest(path, block_size=HASH_BLOCK_SIZE):
+    """流式计算文件内容的 SHA-256，内存占用与文件大小无关"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def generator_id(func):
+    """
+    转换函数的稳定标识，默认为 模块.函数名
+    输出相同的不同实现（例如串行和并行填充）通过函数属性 generator_id 声明同一个标识，互相沿用对方的输出
+    """
+    return getattr(func, 'generator_id', f"{func.__module__}.{func.__name__}")
+
+def params_digest(func, suffix, args=(), kwargs=None):
+    """生成函数和参数的摘要，参数变化时已有输出视为过期"""
+    kwargs = {key: value for key, value in (kwargs or {}).items() if key not in VOLATILE_PARAMS}
+    description = {'func': generator_id(func), 'suffix': suffix, 'args': list(args), 'kwargs': kwargs}
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def _stat(path):
+    info = os.stat(path)
+    return info.st_size, info.st_mtime_ns
+
+class BuildManifest:
+    """
+    增量构建清单：记录每个输出对应的输入内容哈希、生成参数摘要和输出内容哈希
+    文件大小和修改时间都未变时直接沿用记录的哈希（不读文件），否则流式重新计算，
+    所以大部分文件未变化时检查只需要 stat
+    路径相对于清单所在目录保存，整个目录移动后清单仍然有效
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.outputs = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.outputs = json.load(f).get('outputs', {})
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.directory)
+
+    def _resolve(self, key):
+        return os.path.join(self.directory, key)
+
+    def _digest(self, path, recorded, prefix):
+        """文件大小和修改时间与记录一致时沿用记录的哈希，否则重新计算"""
+        size, mtime_ns = _stat(path)
+        if recorded and recorded.get(f'{prefix}_size') == size and recorded.get(f'{prefix}_mtime_ns') == mtime_ns:
+            return recorded[f'{prefix}_sha256']
+        return file_digest(path)
+
+    def is_current(self, input_path, output_path, params):
+        """
+        输出存在，且输入内容、参数和输出内容都与记录一致时返回 True
+        内容未变但修改时间变了（例如被 touch 或重新拷贝）时更新记录的修改时间，下次只需 stat
+        """
+        entry = self.outputs.get(self._key(output_path))
+        if entry is None or entry['params'] != params or entry['input'] != self._key(input_path):
+            return False
+        if not os.path.exists(output_path):
+            return False
+        for prefix, path in (('input', input_path), ('output', output_path)):
+            if self._digest(path, entry, prefix) != entry[f'{prefix}_sha256']:
+                return False
+        for prefix, path in (('input', input_path), ('output', output_path)):
+            entry[f'{prefix}_size'], entry[f'{prefix}_mtime_ns'] = _stat(path)
+        return True
+
+    def record(self, input_path, output_path, params, generator=None):
+        """记录一次成功的生成，generator 为生成器标识（见 generator_id），用于 prune 清理不再生成的输出"""
+        key = self._key(output_path)
+        previous = self.outputs.get(key)
+        if previous is not None and previous['input'] != self._key(input_path):
+            previous = None
+        input_size, input_mtime_ns = _stat(input_path)
+        output_size, output_mtime_ns = _stat(output_path)
+        self.outputs[key] = {
+            'input': self._key(input_path),
+            'input_size': input_size,
+            'input_mtime_ns': input_mtime_ns,
+            'input_sha256': self._digest(input_path, previous, 'input'),
+            'params': params,
+            'generator': generator,
+            'output_size': output_size,
+            'output_mtime_ns': output_mtime_ns,
+            'output_sha256': file_digest(output_path),
+            'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def prune(self, generator=None, outputs=None):
+        """
+        清理孤立输出，删除其输出文件并移除记录:
+        - 输入已不存在的条目
+        - 给出 generator 和 outputs（本次运行的 {输出路径: 输入路径}）时，同一生成器对本次的输入生成过、
+          但本次不再生成的输出（例如切换 --compressed 后旧后缀的文件）
+        本次没有处理的输入和其他生成器的输出保持不变
+        输出在生成后被修改过（大小或修改时间不一致）时只移除记录，保留文件
+        返回删除的输出路径列表
+        """
+        current = {self._key(output_path): self._key(input_path) for output_path, input_path in (outputs or {}).items()}
+        current_inputs = set(current.values())
+        removed = []
+        for key, entry in list(self.outputs.items()):
+            superseded = (generator is not None and entry.get('generator') == generator
+                          and entry['input'] in current_inputs and key not in current)
+            if not superseded and os.path.exists(self._resolve(entry['input'])):
+                continue
+            output_path = self._resolve(key)
+            if os.path.exists(output_path) and _stat(output_path) == (entry['output_size'], entry['output_mtime_ns']):
+                os.remove(output_path)
+                removed.append(output_path)
+            del self.outputs[key]
+        return removed
+
+    def save(self):
+        """写到临时文件后原子替换，中途中断不会留下损坏的清单"""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'outputs': self.outputs}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# 缓存目录的默认容量上限（字节）
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+def cache_key(prefix, *params):
+    """由采样参数生成缓存条目名称：可读前缀 + 参数摘要"""
+    digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+    return f"{prefix}_{digest}"
+
+def _entry_size(path):
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+def evict(cache_dir, max_bytes, keep=None):
+    """按最近使用时间淘汰旧条目，直到缓存总大小不超过 max_bytes（keep 指定的条目不会被删除）"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path) or '.tmp-' in name:
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _entry_size(path), name, path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, name, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def cached_arrays(cache_dir, key, fill, names, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    读取或生成一组缓存数组
+
+    参数:
+    - cache_dir: 缓存目录
+    - key: 条目名称，见 cache_key
+    - fill: 未命中时调用 fill(directory)，负责在 directory 中写入 <名称>.npy
+      （可以用 np.lib.format.open_memmap 分块写入，避免整体驻留内存）
+    - names: 条目中包含的数组名称
+    - max_bytes: 缓存目录容量上限，超出时按LRU淘汰
+
+    返回与 names 顺序一致的只读 memmap 数组元组
+    """
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        try:
+            arrays = _load_entry(entry, names)
+            os.utime(entry)  # 记录最近使用时间
+            return arrays
+        except (OSError, ValueError):
+            pass  # 条目不完整或正在被淘汰，重新生成
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # 先写到临时目录再原子重命名，避免多个进程同时写入同一条目
+    tmp = f"{entry}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp)
+    try:
+        fill(tmp)
+        arrays = _load_entry(tmp, names)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # 其他进程已经写好了同一条目；已打开的 memmap 在删除后仍然有效
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    evict(cache_dir, max_bytes, keep=key)
+    return arrays
+
+def _load_entry(entry, names):
+    return tuple(np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in names)
@@ -0,0 +1,258 @@
+import struct
+import zlib
+
+import numpy as np
+
+# 色调映射算子
+TONEMAP_OPERATORS = ('linear', 'reinhard', 'aces')
+
+# 与 8 位图像保持一致的亮度系数（f_dc = 显示值 * 1.7）
+F_DC_SCALE = 1.7
+
+def _read_hdr_header(f):
+    """读取 Radiance HDR 头部，返回 (宽, 高, 是否上下翻转, 是否左右翻转)"""
+    magic = f.readline()
+    if not magic.startswith(b'#?'):
+        raise ValueError("不是有效的 Radiance HDR 文件")
+
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("HDR 文件头部不完整")
+        line = line.strip()
+        if not line:
+            break
+        if line.startswith(b'FORMAT=') and line != b'FORMAT=32-bit_rle_rgbe':
+            raise ValueError(f"不支持的 HDR 像素格式: {line.decode('latin1')}")
+
+    # 分辨率行，例如 "-Y 1024 +X 2048"
+    tokens = f.readline().split()
+    if len(tokens) != 4 or tokens[0][1:] != b'Y' or tokens[2][1:] != b'X':
+        raise ValueError(f"不支持的 HDR 分辨率行: {b' '.join(tokens).decode('latin1')}")
+    height, width = int(tokens[1]), int(tokens[3])
+    return width, height, tokens[0][:1] == b'+', tokens[2][:1] == b'-'
+
+def _decode_rle_scanline(data, pos, width, out):
+    """解码一行新格式RLE扫描线（四个通道分别游程编码）到 out[(width, 4)]，返回新的读取位置"""
+    for channel in range(4):
+        x = 0
+        while x < width:
+            count = data[pos]
+            pos += 1
+            if count > 128:
+                count -= 128
+                out[x:x + count, channel] = data[pos]
+                pos += 1
+            else:
+                out[x:x + count, channel] = np.frombuffer(data, np.uint8, count, pos)
+                pos += count
+            x += count
+    return pos
+
+def rgbe_to_float(rgbe):
+    """把 RGBE 编码的 (..., 4) uint8 数组批量转换为线性 float32 RGB"""
+    exponent = rgbe[..., 3:4].astype(np.int32)
+    scale = (np.ldexp(1.0, exponent - 136) * (exponent > 0)).astype(np.float32)
+    return (rgbe[..., :3].astype(np.float32) + 0.5) * scale
+
+def read_hdr_size(path):
+    """只解析头部，返回 HDR 图像的 (高, 宽)"""
+    with open(path, 'rb') as f:
+        width, height, _, _ = _read_hdr_header(f)
+    return height, width
+
+def read_hdr(path, out=None):
+    """
+    读取 Radiance HDR (.hdr) 文件，返回 (H, W, 3) 的线性 float32 数组
+    out: 可选的预分配数组（例如 memmap），逐行解码写入，不需要整图的中间缓冲
+    """
+    with open(path, 'rb') as f:
+        width, height, flip_y, flip_x = _read_hdr_header(f)
+        data = f.read()
+
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.float32)
+    scanline = np.empty((width, 4), dtype=np.uint8)
+
+    pos = 0
+    for row in range(height):
+        # 新格式RLE扫描线以 2, 2, 宽度高字节, 宽度低字节 开头
+        if 8 <= width < 0x8000 and data[pos] == 2 and data[pos + 1] == 2 and (data[pos + 2] << 8 | data[pos + 3]) == width:
+            pos = _decode_rle_scanline(data, pos + 4, width, scanline)
+        else:
+            # 未压缩扫描线（不支持旧式游程编码）
+            scanline[:] = np.frombuffer(data, np.uint8, width * 4, pos).reshape(width, 4)
+            pos += width * 4
+
+        target = height - 1 - row if flip_y else row
+        pixels = rgbe_to_float(scanline)
+        out[target] = pixels[::-1] if flip_x else pixels
+    return out
+
+# OpenEXR 压缩方式编号及每个数据块包含的扫描线数
+_EXR_NO_COMPRESSION, _EXR_ZIPS, _EXR_ZIP = 0, 2, 3
+_EXR_LINES_PER_BLOCK = {_EXR_NO_COMPRESSION: 1, _EXR_ZIPS: 1, _EXR_ZIP: 16}
+_EXR_PIXEL_TYPES = {0: np.dtype('<u4'), 1: np.dtype('<f2'), 2: np.dtype('<f4')}
+
+def _read_exr_header(f):
+    """读取单部分扫描线 OpenEXR 文件头，返回属性字典（只解析需要的属性）"""
+    magic, version = struct.unpack('<II', f.read(8))
+    if magic != 20000630:
+        raise ValueError("不是有效的 OpenEXR 文件")
+    if version & 0x200:
+        raise ValueError("暂不支持分块（tiled）存储的 OpenEXR 文件")
+    if version & 0x1800:
+        raise ValueError("暂不支持多部分或深度 OpenEXR 文件")
+
+    def read_cstring():
+        chars = bytearray()
+        while True:
+            c = f.read(1)
+            if not c:
+                raise ValueError("OpenEXR 文件头部不完整")
+            if c == b'\x00':
+                return chars.decode('latin1')
+            chars += c
+
+    header = {}
+    while True:
+        name = read_cstring()
+        if not name:
+            break
+        attr_type = read_cstring()
+        size, = struct.unpack('<i', f.read(4))
+        value = f.read(size)
+
+        if attr_type == 'chlist':
+            channels = []
+            pos = 0
+            while value[pos] != 0:
+                end = value.index(b'\x00', pos)
+                channel_name = value[pos:end].decode('latin1')
+                pixel_type, _, x_sampling, y_sampling = struct.unpack_from('<iB3xii', value, end + 1)
+                channels.append((channel_name, pixel_type, x_sampling, y_sampling))
+                pos = end + 1 + 16
+            header['channels'] = channels
+        elif attr_type == 'compression':
+            header['compression'] = value[0]
+        elif name == 'dataWindow':
+            header['dataWindow'] = struct.unpack('<iiii', value)
+    return header
+
+def _undo_zip_predictor(raw):
+    """OpenEXR ZIP 压缩的逆预测和字节重排"""
+    t = np.frombuffer(raw, dtype=np.uint8).astype(np.int64)
+    t[1:] -= 128
+    t = np.cumsum(t) & 0xFF
+    half = (len(t) + 1) // 2
+    out = np.empty(len(t), dtype=np.uint8)
+    out[0::2] = t[:half]
+    out[1::2] = t[half:]
+    return out
+
+def _read_exr_with_openexr(path):
+    """使用可选的 OpenEXR 库读取本模块无法直接解码的 EXR 文件"""
+    try:
+        import OpenEXR
+    except ImportError:
+        raise ValueError("该 OpenEXR 文件使用的压缩方式需要安装 OpenEXR 库 (pip install OpenEXR)") from None
+
+    with OpenEXR.File(path) as exr:
+        channels = exr.channels()
+        if 'RGB' in channels:
+            pixels = channels['RGB'].pixels
+        elif 'RGBA' in channels:
+            pixels = channels['RGBA'].pixels[..., :3]
+        else:
+            pixels = np.stack([channels[name].pixels for name in ('R', 'G', 'B')], axis=-1)
+    return np.asarray(pixels, dtype=np.float32)
+
+def read_exr_size(path):
+    """只解析头部，返回 OpenEXR 图像的 (高, 宽)"""
+    with open(path, 'rb') as f:
+        x_min, y_min, x_max, y_max = _read_exr_header(f)['dataWindow']
+    return y_max - y_min + 1, x_max - x_min + 1
+
+def read_exr(path, out=None):
+    """
+    读取 OpenEXR (.exr) 文件，返回 (H, W, 3) 的线性 float32 数组
+    直接支持无压缩、ZIPS、ZIP 的扫描线文件，其他压缩方式交给可选的 OpenEXR 库
+    out: 可选的预分配数组（例如 memmap），按数据块解码写入
+    """
+    with open(path, 'rb') as f:
+        header = _read_exr_header(f)
+        compression = header.get('compression', _EXR_NO_COMPRESSION)
+        if compression not in _EXR_LINES_PER_BLOCK:
+            pixels = _read_exr_with_openexr(path)
+            if out is None:
+                return pixels
+            out[:] = pixels
+            return out
+
+        x_min, y_min, x_max, y_max = header['dataWindow']
+        width, height = x_max - x_min + 1, y_max - y_min + 1
+        channels = sorted(header['channels'])
+        if any(c[2] != 1 or c[3] != 1 for c in channels):
+            raise ValueError("暂不支持子采样的 OpenEXR 通道")
+
+        names = [c[0] for c in channels]
+        if all(n in names for n in ('R', 'G', 'B')):
+            wanted = ('R', 'G', 'B')
+        elif 'Y' in names:
+            wanted = ('Y', 'Y', 'Y')
+        else:
+            raise ValueError(f"OpenEXR 文件中没有 RGB 通道: {', '.join(names)}")
+
+        # 每行数据按通道名排序依次存放
+        line_dtype = np.dtype([(name, _EXR_PIXEL_TYPES[pixel_type], (width,)) for name, pixel_type, _, _ in channels])
+        lines_per_block = _EXR_LINES_PER_BLOCK[compression]
+        num_blocks = (height + lines_per_block - 1) // lines_per_block
+        offsets = np.frombuffer(f.read(8 * num_blocks), dtype='<u8')
+
+        if out is None:
+            out = np.empty((height, width, 3), dtype=np.float32)
+
+        for offset in offsets:
+            f.seek(int(offset))
+            y, size = struct.unpack('<ii', f.read(8))
+            packed = f.read(size)
+            row = y - y_min
+            lines = min(lines_per_block, height - row)
+            expected = lines * line_dtype.itemsize
+            if compression != _EXR_NO_COMPRESSION and size < expected:
+                packed = _undo_zip_predictor(zlib.decompress(packed))
+            block = np.frombuffer(packed, dtype=line_dtype, count=lines)
+            for k, name in enumerate(wanted):
+                out[row:row + lines, :, k] = block[name]
+    return out
+
+def srgb_encode(linear):
+    """线性值转换为 sRGB 编码的显示值"""
+    linear = np.clip(linear, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * np.power(linear, 1 / 2.4) - 0.055)
+
+def srgb_decode(encoded):
+    """sRGB 编码的显示值（0-1）转换为线性值"""
+    encoded = np.clip(np.asarray(encoded, dtype=np.float64), 0.0, 1.0)
+    return np.where(encoded <= 0.04045, encoded / 12.92, np.power((encoded + 0.055) / 1.055, 2.4))
+
+def tonemap(linear, exposure=0.0, operator='aces'):
+    """
+    对线性HDR颜色做曝光调整和色调映射，返回 [0, 1] 范围的 sRGB 显示值
+    exposure: 曝光补偿（档），颜色乘以 2 ** exposure
+    operator: 'linear'（直接截断）、'reinhard' 或 'aces'（Narkowicz 拟合曲线）
+    """
+    x = np.maximum(np.asarray(linear, dtype=np.float32) * np.float32(2.0 ** exposure), 0.0)
+    if operator == 'linear':
+        mapped = x
+    elif operator == 'reinhard':
+        mapped = x / (1.0 + x)
+    elif operator == 'aces':
+        mapped = (x * (2.51 * x + 0.03)) / (x * (2.43 * x + 0.59) + 0.14)
+    else:
+        raise ValueError(f"未知的色调映射算子: {operator}，可选 {', '.join(TONEMAP_OPERATORS)}")
+    return srgb_encode(mapped)
+
+def hdr_to_f_dc(linear, exposure=0.0, operator='aces'):
+    """把线性HDR颜色数组整体转换为 f_dc 值"""
+    return tonemap(linear, exposure, operator).astype(np.float64) * F_DC_SCALE
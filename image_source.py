@@ -0,0 +1,393 @@
+import functools
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from PIL import Image
+
+from hdr_io import hdr_to_f_dc, read_exr, read_exr_size, read_hdr, read_hdr_size
+from tile_mosaic import TileMosaic, open_tile_grid, open_tiled_tiff
+
+# 分带采样时每带的行数，内存占用约为 宽度 * DEFAULT_BAND_ROWS * 3 字节
+DEFAULT_BAND_ROWS = 512
+
+# 浮点HDR格式的 (尺寸读取函数, 像素读取函数)
+HDR_FORMATS = {'.hdr': (read_hdr_size, read_hdr), '.exr': (read_exr_size, read_exr)}
+
+# 可以直接映射的未压缩像素格式及其通道数
+_RAW_CHANNELS = {'RGB': 3, 'BGR': 3, 'RGBA': 4, 'RGBX': 4}
+
+def load_image_pixels(image):
+    """
+    把PIL图像解码为 (H, W, C) 的 uint8 数组（C 为 3 或 4），灰度/调色板图像转换为RGB
+    颜色取前三个通道
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+def _raw_args(tile):
+    """把 raw 解码器参数统一成 (rawmode, stride, orientation)"""
+    args = tile[3]
+    if isinstance(args, str):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    return rawmode, stride, orientation
+
+def map_raw_pixels(image):
+    """
+    对未压缩的 TIFF/BMP，直接把文件中的像素区映射为 (H, W, C) 的只读 memmap
+    格式不支持时返回 None
+    """
+    width, height = image.size
+    tiles = sorted(image.tile, key=lambda t: t[1][1])
+    if not tiles or any(t[0] != 'raw' for t in tiles):
+        return None
+
+    raw_args = _raw_args(tiles[0])
+    rawmode, stride, orientation = raw_args
+    channels = _RAW_CHANNELS.get(rawmode)
+    if channels is None:
+        return None
+    stride = stride or width * channels
+
+    # 多个条带（strip）时要求它们参数一致，且在文件中首尾相接
+    offset = tiles[0][2]
+    for tile in tiles:
+        x0, y0, x1, _ = tile[1]
+        if (x0, x1) != (0, width) or _raw_args(tile) != raw_args:
+            return None
+        if tile[2] != offset + y0 * stride:
+            return None
+
+    mapped = np.memmap(image.filename, dtype=np.uint8, mode='r', offset=offset, shape=(height, stride))
+    pixels = mapped[:, :width * channels].reshape(height, width, channels)
+    if orientation < 0:
+        pixels = pixels[::-1]  # BMP 按从下到上的顺序存储
+    if rawmode == 'BGR':
+        pixels = pixels[..., ::-1]
+    return pixels
+
+def raw_cache_path(raw_cache_dir, image_path):
+    """原始像素缓存文件路径，由图像路径、大小和修改时间决定，源文件变化后自动失效"""
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(raw_cache_dir, f"{stem}_{digest}.npy")
+
+def _write_npy_atomic(cache_path, shape, dtype, fill):
+    """创建 .npy 内存映射并交给 fill 填充，完成后再重命名为 cache_path"""
+    tmp = f"{cache_path}.tmp-{uuid.uuid4().hex}"
+    try:
+        pixels = open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+        fill(pixels)
+        pixels.flush()
+        del pixels
+        os.replace(tmp, cache_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def write_raw_cache(image, cache_path, band_rows=DEFAULT_BAND_ROWS):
+    """把图像按行带转换为RGB并写入 .npy 缓存（先写临时文件再重命名）"""
+    width, height = image.size
+
+    def fill(pixels):
+        for top in range(0, height, band_rows):
+            bottom = min(top + band_rows, height)
+            band = image.crop((0, top, width, bottom))
+            pixels[top:bottom] = load_image_pixels(band)[..., :3]
+
+    _write_npy_atomic(cache_path, (height, width, 3), np.uint8, fill)
+
+def open_pixels(image_path, raw_cache_dir=None):
+    """
+    打开图像像素，尽量避免整张图像解码后常驻内存:
+    - .npy 文件直接内存映射
+    - 未压缩的 TIFF/BMP 直接映射文件中的像素区
+    - 其他格式在指定 raw_cache_dir 时首次解码写入 .npy 缓存，之后直接内存映射
+    - 否则整图解码到内存
+    - 图块网格清单（.json）和内部分块的 TIFF 返回 TileMosaic，采样时只解码用到的图块
+    .hdr/.exr 返回 (H, W, 3) 的线性 float32 数组，其他格式返回 (H, W, C) 的 uint8 数组
+    （可能是 memmap），颜色取前三个通道
+    """
+    extension = os.path.splitext(image_path)[1].lower()
+    if extension == '.npy':
+        return np.load(image_path, mmap_mode='r')
+
+    if extension == '.json':
+        return open_tile_grid(image_path, lambda tile_path: open_pixels(tile_path, raw_cache_dir))
+
+    if extension in HDR_FORMATS:
+        read_size, read = HDR_FORMATS[extension]
+        if raw_cache_dir is None:
+            return read(image_path)
+        cache_path = raw_cache_path(raw_cache_dir, image_path)
+        if not os.path.exists(cache_path):
+            os.makedirs(raw_cache_dir, exist_ok=True)
+            _write_npy_atomic(cache_path, read_size(image_path) + (3,), np.float32,
+                              lambda pixels: read(image_path, out=pixels))
+        return np.load(cache_path, mmap_mode='r')
+
+    image = Image.open(image_path)
+    pixels = map_raw_pixels(image)
+    if pixels is not None:
+        return pixels
+
+    if image.format == 'TIFF':
+        mosaic = open_tiled_tiff(image)
+        if mosaic is not None:
+            image.close()
+            return mosaic
+
+    if raw_cache_dir is None:
+        return load_image_pixels(image)
+
+    cache_path = raw_cache_path(raw_cache_dir, image_path)
+    if not os.path.exists(cache_path):
+        os.makedirs(raw_cache_dir, exist_ok=True)
+        write_raw_cache(image, cache_path)
+    image.close()
+    return np.load(cache_path, mmap_mode='r')
+
+def gather_rgb(pixels, rows, cols, band_rows=DEFAULT_BAND_ROWS):
+    """
+    按像素坐标批量取出RGB值，返回 (N, 3) 数组，类型与 pixels 相同
+    pixels 为内存映射时，先按行排序再逐个行带读取，内存只与带高有关；
+    pixels 为 TileMosaic 时按图块分组，每个用到的图块只解码一次
+    """
+    if isinstance(pixels, TileMosaic):
+        return pixels.gather(rows, cols)
+    if not isinstance(pixels, np.memmap) or band_rows is None:
+        return pixels[rows, cols, :3]
+
+    out = np.empty((len(rows), 3), dtype=pixels.dtype)
+    if len(rows) == 0:
+        return out
+
+    order = np.argsort(rows, kind='stable')
+    sorted_rows = rows[order]
+    first_band = int(sorted_rows[0]) // band_rows
+    last_band = int(sorted_rows[-1]) // band_rows
+    edges = np.searchsorted(sorted_rows, np.arange(first_band, last_band + 2) * band_rows)
+
+    for k in range(last_band - first_band + 1):
+        lo, hi = edges[k], edges[k + 1]
+        if lo == hi:
+            continue
+        top = (first_band + k) * band_rows
+        band = np.array(pixels[top:top + band_rows, :, :3])
+        selected = order[lo:hi]
+        out[selected] = band[rows[selected] - top, cols[selected]]
+    return out
+
+class SummedAreaTable:
+    """
+    分块存储的RGB积分图（summed-area table），按 sat.lookup(rows, cols) 查询
+    S(y, x) 为 [0, y) x [0, x) 区域内的像素之和，按 block x block 的块分解为
+        S(y, x) = S(y0, x) + S(y, x0) - S(y0, x0) + 块内局部和 [y0, y) x [x0, x)
+    其中 (y0, x0) 为所在块的左上角：块边界处的行/列积分（row_sums/col_sums）用 float64 保存，
+    块内局部和（local）用 float32 保存，合计约 12 字节/像素（完整 float64 积分图为 24 字节/像素）
+    block 不超过 256 时 8 位图像的块内和不超过 2^24，float32 可以精确表示，结果与 float64 积分图相同
+    浮点HDR图像的块内和有 float32 舍入（相对误差约 1e-7），只影响块内和，不随图像尺寸累积
+    """
+
+    def __init__(self, local, row_sums, col_sums, block):
+        self.local = local
+        self.row_sums = row_sums
+        self.col_sums = col_sums
+        self.block = block
+        self.height, self.width = local.shape[0] - 1, local.shape[1] - 1
+
+    def lookup(self, rows, cols):
+        """返回 S(rows, cols)，形状为 (N, 3) 的 float64 数组"""
+        block_rows, block_cols = rows // self.block, cols // self.block
+        return (self.row_sums[block_rows, cols] + self.col_sums[rows, block_cols]
+                - self.row_sums[block_rows, block_cols * self.block] + self.local[rows, cols])
+
+    def save(self, directory):
+        """
+        把各部分保存为 directory 下的 .npy，返回可以 pickle 的 open(pixels)，
+        其他进程调用 open(pixels) 以内存映射方式共享（pixels 为该进程打开的图像，这里不需要）
+        """
+        for name in ('local', 'row_sums', 'col_sums'):
+            np.save(os.path.join(directory, f'sat_{name}.npy'), getattr(self, name))
+        return functools.partial(SummedAreaTable.load, directory, self.block)
+
+    @classmethod
+    def load(cls, directory, block, pixels=None):
+        arrays = [np.load(os.path.join(directory, f'sat_{name}.npy'), mmap_mode='r')
+                  for name in ('local', 'row_sums', 'col_sums')]
+        return cls(*arrays, block)
+
+class MosaicSummedAreaTable:
+    """
+    TileMosaic 的积分图，常驻内存与图块缓存相当，而不是与整幅图像成正比
+    与 SummedAreaTable 相同的分解，块取 TileMosaic 的图块：图块边界处的行/列积分（float64）常驻内存，
+    各图块内部的积分图（SummedAreaTable）在查询用到时由图块计算，保存在 LRU 缓存中，
+    总大小不超过图块缓存的上限 mosaic.max_cache_bytes（至少容纳一行图块）
+    """
+
+    def __init__(self, mosaic, row_sums, col_sums, band_rows=DEFAULT_BAND_ROWS):
+        self.mosaic = mosaic
+        self.row_sums = row_sums
+        self.col_sums = col_sums
+        self.band_rows = band_rows
+        self.height, self.width = mosaic.shape[:2]
+        self.computed_tiles = 0
+        self._cache = OrderedDict()
+        # 图块积分图约 12 字节/像素
+        tile_bytes = int(np.diff(mosaic.row_edges).max() * np.diff(mosaic.col_edges).max()) * 12
+        self.max_cached_tiles = max(1, mosaic.grid_shape[1], mosaic.max_cache_bytes // tile_bytes)
+
+    @classmethod
+    def build(cls, mosaic, band_rows=DEFAULT_BAND_ROWS):
+        """逐行图块计算边界处的行/列积分，每个图块解码一次，只保留图块的行和、列和"""
+        height, width = mosaic.shape[:2]
+        row_edges, col_edges = mosaic.row_edges, mosaic.col_edges
+        grid_rows, grid_cols = mosaic.grid_shape
+        row_sums = np.zeros((grid_rows + 1, width + 1, 3), dtype=np.float64)
+        col_sums = np.zeros((height + 1, grid_cols + 1, 3), dtype=np.float64)
+        for tile_row in range(grid_rows):
+            top, bottom = row_edges[tile_row], row_edges[tile_row + 1]
+            column_totals = np.empty((width, 3), dtype=np.float64)
+            # row_prefix[r, k] 为本行图块第 r 行在前 k 个图块中的和
+            row_prefix = np.zeros((bottom - top, grid_cols + 1, 3), dtype=np.float64)
+            for tile_col in range(grid_cols):
+                pixels = mosaic.tile(tile_row, tile_col)
+                column_totals[col_edges[tile_col]:col_edges[tile_col + 1]] = pixels.sum(axis=0, dtype=np.float64)
+                row_prefix[:, tile_col + 1] = row_prefix[:, tile_col] + pixels.sum(axis=1, dtype=np.float64)
+            row_sums[tile_row + 1, 1:] = row_sums[tile_row, 1:] + np.cumsum(column_totals, axis=0)
+            col_sums[top + 1:bottom + 1] = row_sums[tile_row, col_edges] + np.cumsum(row_prefix, axis=0)
+        return cls(mosaic, row_sums, col_sums, band_rows)
+
+    def _local(self, tile_row, tile_col):
+        """取一个图块内部的积分图，优先使用缓存"""
+        key = (tile_row, tile_col)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        local = summed_area_table(self.mosaic.tile(tile_row, tile_col), self.band_rows)
+        self.computed_tiles += 1
+        self._cache[key] = local
+        while len(self._cache) > self.max_cached_tiles:
+            self._cache.popitem(last=False)
+        return local
+
+    def lookup(self, rows, cols):
+        """返回 S(rows, cols)，形状为 (N, 3) 的 float64 数组；按图块分组，每次调用中每个图块的积分图最多计算一次"""
+        row_edges, col_edges = self.mosaic.row_edges, self.mosaic.col_edges
+        tile_rows = np.searchsorted(row_edges, rows, side='right') - 1
+        tile_cols = np.searchsorted(col_edges, cols, side='right') - 1
+        local_rows, local_cols = rows - row_edges[tile_rows], cols - col_edges[tile_cols]
+        total = (self.row_sums[tile_rows, cols] + self.col_sums[rows, tile_cols]
+                 - self.row_sums[tile_rows, col_edges[tile_cols]])
+
+        # 落在图块上边界或左边界上的坐标局部和为 0，其余按图块分组查询图块内部的积分图
+        inside = np.flatnonzero((local_rows > 0) & (local_cols > 0))
+        tile_ids = tile_rows[inside] * self.mosaic.grid_shape[1] + tile_cols[inside]
+        order = np.argsort(tile_ids, kind='stable')
+        sorted_ids = tile_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if len(order) else []
+        stops = np.r_[starts[1:], len(order)]
+        groups = [(divmod(int(sorted_ids[lo]), self.mosaic.grid_shape[1]), lo, hi) for lo, hi in zip(starts, stops)]
+        groups.sort(key=lambda group: group[0] not in self._cache)
+        for (tile_row, tile_col), lo, hi in groups:
+            selected = inside[order[lo:hi]]
+            total[selected] += self._local(tile_row, tile_col).lookup(local_rows[selected], local_cols[selected])
+        return total
+
+    def save(self, directory):
+        """保存边界积分，返回 open(pixels)：其他进程用自己打开的 TileMosaic 重建（图块积分图按需重新计算）"""
+        for name in ('row_sums', 'col_sums'):
+            np.save(os.path.join(directory, f'sat_{name}.npy'), getattr(self, name))
+        return functools.partial(MosaicSummedAreaTable.load, directory, self.band_rows)
+
+    @classmethod
+    def load(cls, directory, band_rows, pixels):
+        arrays = [np.load(os.path.join(directory, f'sat_{name}.npy'), mmap_mode='r') for name in ('row_sums', 'col_sums')]
+        return cls(pixels, *arrays, band_rows)
+
+# 积分图分块的最大边长，保证8位图像的块内和可以用 float32 精确表示（256 * 256 * 255 < 2^24）
+SAT_MAX_BLOCK = 256
+
+def summed_area_table(pixels, band_rows=DEFAULT_BAND_ROWS):
+    """
+    计算RGB积分图，返回 SummedAreaTable（TileMosaic 返回 MosaicSummedAreaTable），用 lookup 查询
+    每次只读取 block 行并转为 float64 累加（block = min(band_rows, SAT_MAX_BLOCK)），
+    块边界的列积分作为跨行带的累计值保存，输入可以是内存映射
+    """
+    if isinstance(pixels, TileMosaic):
+        return MosaicSummedAreaTable.build(pixels, band_rows)
+    height, width = pixels.shape[:2]
+    block = max(1, min(band_rows, SAT_MAX_BLOCK))
+    local = np.zeros((height + 1, width + 1, 3), dtype=np.float32)
+    row_sums = np.zeros((height // block + 1, width + 1, 3), dtype=np.float64)
+    col_sums = np.zeros((height + 1, width // block + 1, 3), dtype=np.float64)
+    for top in range(0, height, block):
+        bottom = min(top + block, height)
+        # band[r, x] 为本带内 [top, top + r) x [0, x) 的和
+        band = np.zeros((bottom - top + 1, width + 1, 3), dtype=np.float64)
+        np.cumsum(np.asarray(pixels[top:bottom, :, :3], dtype=np.float64), axis=1, out=band[1:, 1:])
+        np.cumsum(band, axis=0, out=band)
+        corners = band[:, ::block].copy()
+        col_sums[top + 1:bottom + 1] = row_sums[top // block, ::block] + corners[1:]
+        if bottom - top == block:
+            row_sums[top // block + 1] = row_sums[top // block] + band[-1]
+        # 块内局部和：减去各块左边界的值，块的最后一行属于下一块行，局部和为 0
+        for k in range(corners.shape[1]):
+            band[:, k * block:(k + 1) * block] -= corners[:, k:k + 1]
+        rows = min(bottom - top, block - 1)
+        local[top + 1:top + rows + 1] = band[1:rows + 1]
+    return SummedAreaTable(local, row_sums, col_sums, block)
+
+def _sat_lookup(sat, rows, cols, wrap):
+    """读取积分图；wrap=True 时列坐标可以越界，按整圈数累加实现水平循环"""
+    if not wrap:
+        return sat.lookup(rows, cols)
+    laps, cols = np.divmod(cols, sat.width)
+    return sat.lookup(rows, cols) + laps[:, None] * sat.lookup(rows, np.full_like(cols, sat.width))
+
+def box_filter_rgb(sat, rows, cols, half_rows, half_cols, wrap=False):
+    """
+    用积分图求以 (rows, cols) 为中心、(2*half_rows+1) x (2*half_cols+1) 像素方框内的平均颜色
+    每个点只需四次查表；wrap=True 时水平方向循环（全景图左右相接），否则在图像边界处截断
+    返回 (N, 3) float64 数组，半径为 0 时等同于最近像素采样
+    """
+    height, width = sat.height, sat.width
+    top = np.maximum(rows - half_rows, 0)
+    bottom = np.minimum(rows + half_rows + 1, height)
+    if wrap:
+        half_cols = np.minimum(half_cols, (width - 1) // 2)
+        left = cols - half_cols
+        right = cols + half_cols + 1
+    else:
+        left = np.maximum(cols - half_cols, 0)
+        right = np.minimum(cols + half_cols + 1, width)
+
+    total = (_sat_lookup(sat, bottom, right, wrap) - _sat_lookup(sat, top, right, wrap)
+             - _sat_lookup(sat, bottom, left, wrap) + _sat_lookup(sat, top, left, wrap))
+    return total / ((bottom - top) * (right - left))[:, None]
+
+def footprint_half_size(size):
+    """把像素单位的覆盖尺寸换算成方框半径（整数，最小为 0）"""
+    return np.maximum(np.rint((np.asarray(size) - 1) / 2), 0).astype(np.int64)
+
+def colors_to_f_dc(colors, exposure=0.0, tonemap='aces', hdr=None):
+    """
+    把采样得到的颜色整体转换为 f_dc 值
+    8 位颜色归一化后乘以常数（基于示例数据）；浮点HDR颜色先做曝光和色调映射
+    hdr: 颜色是否来自浮点HDR图像，None 时根据 colors 的类型判断（预过滤得到的平均值需要显式指定）
+    """
+    if hdr is None:
+        hdr = colors.dtype != np.uint8
+    if not hdr:
+        return colors.astype(np.float64) / 255.0 * 1.7
+    return hdr_to_f_dc(colors, exposure, tonemap)
@@ -1,171 +1,345 @@
 import numpy as np
-from PIL import Image
-import struct
+from numpy.lib.format import open_memmap
 import os
 import math
 import glob
+import functools
+import shutil
+import tempfile
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def fibonacci_sphere(samples=1000, radius=100):
+from adaptive_sky import adaptive_points, adaptive_savings, build_adaptive_layout
+from batch_runner import expand_inputs, run_batch, run_pipelined
+from build_manifest import BuildManifest
+from geometry_cache import DEFAULT_CACHE_MAX_BYTES, cache_key, cached_arrays
+from hdr_io import TONEMAP_OPERATORS
+from image_source import (DEFAULT_BAND_ROWS, box_filter_rgb, colors_to_f_dc, footprint_half_size, gather_rgb,
+                          open_pixels, summed_area_table)
+from profiling import NULL_PROFILE, enable_profiling, start_profile
+from ply_writer import (DEFAULT_CHUNK_SIZE, PlyStreamWriter, ThreadedWriter, allocate_vertices, create_ply_memmap,
+                        fill_gaussians, gaussian_properties, iter_chunks, vertex_dtype)
+from splat_compress import CompressedPlyWriter
+
+def fibonacci_sphere(samples=1000, radius=100, start=0, stop=None):
     """
     使用黄金螺旋算法生成均匀分布的球面点
+    每个点的位置只取决于其序号，可以只计算 [start, stop) 区间的点用于分块生成
+    返回形状为 (stop - start, 3) 的 float64 数组
     """
-    points = []
     phi = math.pi * (3. - math.sqrt(5.))  # 黄金角度
 
-    for i in range(samples):
-        y = 1 - (i / float(samples - 1)) * 2  # y从1到-1
-        radius_at_y = math.sqrt(1 - y * y)  # 在当前y值的圆半径
-        
-        theta = phi * i  # 黄金角度递增
-        
-        x = math.cos(theta) * radius_at_y
-        z = math.sin(theta) * radius_at_y
-        
-        # 缩放到指定半径
-        points.append((x * radius, y * radius, z * radius))
-    
-    return points
+    i = np.arange(start, samples if stop is None else stop, dtype=np.float64)
+    y = 1 - (i / float(samples - 1)) * 2  # y从1到-1
+    radius_at_y = np.sqrt(1 - y * y)  # 在当前y值的圆半径
 
-def generate_sky_sphere(hdri_path, output_file, num_points, radius):
-    # 加载HDRI图像
-    hdri = Image.open(hdri_path)
-    hdri_width, hdri_height = hdri.size
-    
-    # 生成均匀分布的球面点
-    points = fibonacci_sphere(samples=num_points, radius=radius)
-    
-    # 准备PLY文件头部
-    ply_header = f"""ply
-format binary_little_endian 1.0
-element vertex {num_points}
-property float x
-property float y
-property float z
-property float nxx
-property float ny
-property float nz
-property float f_dc_0
-property float f_dc_1
-property float f_dc_2
-property float f_rest_0
-property float f_rest_1
-property float f_rest_2
-property float f_rest_3
-property float f_rest_4
-property float f_rest_5
-property float f_rest_6
-property float f_rest_7
-property float f_rest_8
-property float f_rest_9
-property float f_rest_10
-property float f_rest_11
-property float f_rest_12
-property float f_rest_13
-property float f_rest_14
-property float f_rest_15
-property float f_rest_16
-property float f_rest_17
-property float f_rest_18
-property float f_rest_19
-property float f_rest_20
-property float f_rest_21
-property float f_rest_22
-property float f_rest_23
-property float f_rest_24
-property float f_rest_25
-property float f_rest_26
-property float f_rest_27
-property float f_rest_28
-property float f_rest_29
-property float f_rest_30
-property float f_rest_31
-property float f_rest_32
-property float f_rest_33
-property float f_rest_34
-property float f_rest_35
-property float f_rest_36
-property float f_rest_37
-property float f_rest_38
-property float f_rest_39
-property float f_rest_40
-property float f_rest_41
-property float f_rest_42
-property float f_rest_43
-property float f_rest_44
-property float opacity
-property float scale_0
-property float scale_1
-property float scale_2
-property float rot_0
-property float rot_1
-property float rot_2
-property float rot_3
-end_header
-"""
-
-    with open(output_file, 'wb') as f:
-        f.write(ply_header.encode('ascii'))
-        
-        for point in points:
-            x, y, z = point
-            
-            # 将笛卡尔坐标转换为球坐标（用于HDRI映射）
-            r = np.sqrt(x*x + y*y + z*z)
-            theta = np.arccos(y / r)  # 0到π
-            phi = np.arctan2(z, x)    # -π到π
-            
-            # 调整phi为0到2π范围
-            if phi < 0:
-                phi += 2 * np.pi
-            
-            # 计算HDRI上的UV坐标
-            u = phi / (2 * np.pi) * hdri_width
-            v = (1 - theta / np.pi) * hdri_height
-            
-            # 对u和v进行插值，确保在图像范围内
-            u = int(u) % hdri_width
-            v = min(max(int(v), 0), hdri_height - 1)
-            
-            # 获取HDRI颜色值
-            pixel = hdri.getpixel((u, v))
-            
-            # 如果HDRI是RGB格式
-            if len(pixel) == 3:
-                r, g, b = pixel
-            # 如果HDRI是RGBA格式
-            elif len(pixel) == 4:
-                r, g, b, a = pixel
-            else:
-                r = g = b = pixel
-            
-            # 将RGB值归一化后乘以常数（基于示例数据）
-            r_norm = (r / 255.0) * 1.7
-            g_norm = (g / 255.0) * 1.7
-            b_norm = (b / 255.0) * 1.7
-            
-            # 写入顶点数据
-            # 位置 (x, y, z)
-            f.write(struct.pack('<fff', x, y, z))
-            
-            # 法线 (nx, ny, nz) - 设为0
-            f.write(struct.pack('<fff', 0.0, 0.0, 0.0))
-            
-            # 颜色 (f_dc_0, f_dc_1, f_dc_2)
-            f.write(struct.pack('<fff', r_norm, g_norm, b_norm))
-            
-            # f_rest_0到f_rest_44 - 设为小随机值
-            for _ in range(45):
-                f.write(struct.pack('<f', np.random.uniform(-0.03, 0.02)))
-            
-            # opacity, scale_0, scale_1, scale_2
-            f.write(struct.pack('<ffff', 4.6, 0.636, 0.636, 0.636))
-            
-            # rot_0, rot_1, rot_2, rot_3
-            f.write(struct.pack('<ffff', 1.0, 0.0, 0.0, 0.0))
+    theta = phi * i  # 黄金角度递增
+
+    x = np.cos(theta) * radius_at_y
+    z = np.sin(theta) * radius_at_y
+
+    # 缩放到指定半径
+    return np.column_stack((x * radius, y * radius, z * radius))
+
+def equirect_pixel_coords(points, width, height):
+    """
+    将笛卡尔坐标批量转换为等距柱状投影（全景图）上的像素坐标
+    返回 (u, v) 两个整数数组
+    """
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+
+    # 将笛卡尔坐标转换为球坐标（用于HDRI映射）
+    r = np.sqrt(x * x + y * y + z * z)
+    theta = np.arccos(np.clip(y / r, -1.0, 1.0))  # 0到π
+    phi = np.arctan2(z, x)                         # -π到π
+
+    # 调整phi为0到2π范围
+    phi = np.where(phi < 0, phi + 2 * np.pi, phi)
+
+    # 计算HDRI上的UV坐标
+    u = phi / (2 * np.pi) * width
+    v = (1 - theta / np.pi) * height
+
+    # 取整并确保在图像范围内
+    u = u.astype(np.int64) % width
+    v = np.clip(v.astype(np.int64), 0, height - 1)
+    return u, v
+
+def sky_footprint(rows, density, width, height):
+    """
+    每个点覆盖的球面单元（面积为 1/密度 球面度）在全景图上的方框半径（像素）
+    density 为每球面度的点数（均匀分布时为 N/4π，可以是逐点数组）；水平方向随纬度按 1/sin(θ) 放大
+    """
+    cell = np.sqrt(1.0 / np.asarray(density, dtype=np.float64))  # 单元边长（弧度）
+    sin_theta = np.maximum(np.sin(np.pi * (rows + 0.5) / height), 1e-6)
+    half_rows = footprint_half_size(np.broadcast_to(cell / math.pi * height, rows.shape))
+    half_cols = footprint_half_size(cell / sin_theta / (2 * math.pi) * width)
+    return half_rows, half_cols
+
+def compute_sky_lookup(num_points, radius, width, height, start=0, stop=None):
+    """计算 [start, stop) 区间的球面点位置以及每个点在全景图上对应的扁平像素索引 (v * width + u)"""
+    points = fibonacci_sphere(samples=num_points, radius=radius, start=start, stop=stop)
+    u, v = equirect_pixel_coords(points, width, height)
+    index_dtype = np.int32 if width * height < 2 ** 31 else np.int64
+    return points.astype(np.float32), (v * width + u).astype(index_dtype)
+
+def cached_sky_lookup(cache_dir, num_points, radius, width, height,
+                      cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    从缓存目录读取球面点位置和像素索引（只读 memmap），未命中时分块生成并写入缓存
+    相同参数和分辨率的全景图可以直接复用
+    """
+    def fill(directory):
+        index_dtype = np.int32 if width * height < 2 ** 31 else np.int64
+        positions = open_memmap(os.path.join(directory, 'positions.npy'), mode='w+', dtype=np.float32, shape=(num_points, 3))
+        pixel_index = open_memmap(os.path.join(directory, 'pixel_index.npy'), mode='w+', dtype=index_dtype, shape=(num_points,))
+        for start, stop in iter_chunks(num_points, chunk_size):
+            positions[start:stop], pixel_index[start:stop] = compute_sky_lookup(num_points, radius, width, height, start, stop)
+        positions.flush()
+        pixel_index.flush()
+
+    key = cache_key('sky', num_points, float(radius), width, height)
+    return cached_arrays(cache_dir, key, fill, ('positions', 'pixel_index'), cache_max_bytes)
+
+def sky_context(pixels, num_points, radius, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                chunk_size=DEFAULT_CHUNK_SIZE, band_rows=DEFAULT_BAND_ROWS, exposure=0.0, tonemap='aces',
+                prefilter=False, adaptive=False, min_density=0.1, detail_resolution=256, seed=None, layout=None):
+    """
+    准备逐块生成天空球所需的状态（积分图、自适应布局或查找表缓存），供 sky_chunk 使用
+    参数含义同 generate_sky_sphere；seed 决定自适应布局的格内随机偏移
+    layout: 已构建的自适应布局（build_adaptive_layout 的返回值），给出时直接使用，不再由 pixels 构建
+    """
+    height, width = pixels.shape[:2]
+    context = {
+        'pixels': pixels,
+        'width': width,
+        'height': height,
+        'hdr': pixels.dtype != np.uint8,
+        'num_points': num_points,
+        'radius': radius,
+        'band_rows': band_rows,
+        'exposure': exposure,
+        'tonemap': tonemap,
+        'uniform_density': num_points / (4 * math.pi),
+        'sat': summed_area_table(pixels, band_rows) if prefilter else None,
+        'layout': None,
+        'positions': None,
+        'pixel_index': None,
+    }
+    if layout is not None:
+        context['layout'] = layout
+    elif adaptive:
+        # 根据细节图构建分层采样布局
+        context['layout'] = build_adaptive_layout(pixels, num_points, min_density, detail_resolution, seed)
+    elif cache_dir is not None:
+        # 有缓存时直接映射整份查找表，否则每块现算
+        context['positions'], context['pixel_index'] = cached_sky_lookup(cache_dir, num_points, radius, width, height,
+                                                                         cache_max_bytes, chunk_size)
+    return context
+
+def sky_chunk(context, start, stop, profile=NULL_PROFILE):
+    """
+    计算序号 [start, stop) 的点，返回 (位置, f_dc 颜色, scale)
+    每个点的结果只取决于它的序号，与分块方式无关
+    """
+    width, height = context['width'], context['height']
+    layout = context['layout']
+
+    # 生成球面点及其在全景图上的采样位置
+    density = context['uniform_density']
+    scales = (0.636, 0.636, 0.636)
+    if layout is not None:
+        points, density = adaptive_points(layout, context['num_points'], context['radius'], start, stop)
+        cols, rows = equirect_pixel_coords(points, width, height)
+        # 按局部点间距相对于均匀分布的比例放大/缩小高斯（scale 为对数尺度）
+        scales = (0.636 + 0.5 * np.log(context['uniform_density'] / density))[:, None]
+    else:
+        if context['positions'] is None:
+            points, index = compute_sky_lookup(context['num_points'], context['radius'], width, height, start, stop)
+        else:
+            points, index = context['positions'][start:stop], context['pixel_index'][start:stop]
+        rows, cols = np.divmod(index, width)
+    profile.lap('geometry')
+
+    # 取颜色：预过滤时取每个点覆盖范围内的平均颜色，否则取最近像素
+    if context['sat'] is not None:
+        half_rows, half_cols = sky_footprint(rows, density, width, height)
+        sampled = box_filter_rgb(context['sat'], rows, cols, half_rows, half_cols, wrap=True)
+    else:
+        sampled = gather_rgb(context['pixels'], rows, cols, context['band_rows'])
+    profile.lap('sample')
+
+    # 将颜色转换为 f_dc（8位颜色归一化后乘以常数，HDR颜色先做色调映射）
+    colors = colors_to_f_dc(sampled, context['exposure'], context['tonemap'], hdr=context['hdr'])
+    profile.lap('color')
+    return points, colors, scales
 
+def generate_sky_sphere(hdri_path, output_file, num_points, radius, cache_dir=None,
+                        cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, chunk_size=DEFAULT_CHUNK_SIZE,
+                        raw_cache_dir=None, band_rows=DEFAULT_BAND_ROWS, exposure=0.0, tonemap='aces',
+                        prefilter=False, adaptive=False, min_density=0.1, detail_resolution=256,
+                        compact=False, normals=True, compressed=False, pixels=None, write_queue=0, seed=None, layout=None):
+    """
+    将全景图转换为天空球点云
+    按 chunk_size 个点一块生成、采样并追加写入，峰值内存与总点数无关
+    raw_cache_dir: 原始像素缓存目录，压缩格式首次解码后写入 .npy，之后按 band_rows 行一带内存映射读取
+    exposure, tonemap: 浮点HDR（.hdr/.exr）输入的曝光补偿（档）和色调映射算子
+    prefilter: 用积分图取每个点覆盖的斐波那契单元内的平均颜色，点数远少于像素数时避免走样
+    adaptive: 按细节图分配点密度（细节多的区域更密），并按局部间距放大 scale_* 保证覆盖无空洞
+    min_density: 自适应模式下平坦区域相对于最高密度的下限
+    detail_resolution: 自适应模式下细节图的网格行数（列数为其两倍）
+    compact: 只写出0阶球谐属性（去掉45个 f_rest_*），文件约缩小为原来的 1/4
+    normals: 是否写出法线字段
+    compressed: 写出按256点分块量化的压缩格式（每点16字节，只含0阶球谐），见 splat_compress
+    pixels: 已打开的图像像素（open_pixels 的返回值），流水线批处理时由预读线程提供
+    write_queue: 大于0时由后台线程写出，最多排队 write_queue 个块，文件I/O与下一块的生成重叠
+    seed: 随机种子，给出时 f_rest 噪声按顶点序号由计数器随机数生成，输出可复现
+          （与 generate_sky_sphere_parallel 使用相同种子的结果逐字节相同）
+    layout: 已构建的自适应布局，多帧共用同一布局时避免重复构建（见 sky_sequence）
+    设置环境变量 SKYBOX_PROFILE 时记录各阶段耗时，见 profiling
+    """
+    profile = start_profile('sky', input=hdri_path)
+
+    # 压缩格式只用到位置、f_dc、opacity、scale 和 rot，中间缓冲不需要 f_rest 和法线
+    properties = gaussian_properties(compact or compressed, normals and not compressed)
+
+    # 打开HDRI图像（未压缩格式、.npy 及原始像素缓存以内存映射方式按行带读取）
+    if pixels is None:
+        pixels = open_pixels(hdri_path, raw_cache_dir)
+    profile.lap('open')
+
+    context = sky_context(pixels, num_points, radius, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                          chunk_size=chunk_size, band_rows=band_rows, exposure=exposure, tonemap=tonemap,
+                          prefilter=prefilter, adaptive=adaptive, min_density=min_density,
+                          detail_resolution=detail_resolution, seed=seed, layout=layout)
+    if context['layout'] is not None:
+        # 报告相对于均匀分布节省的点数
+        equivalent, saved = adaptive_savings(context['layout'], num_points)
+        print(f"自适应采样: {num_points} 个点达到均匀分布 {equivalent} 个点的最高细节，节省 {saved:.1%}")
+    profile.lap('setup')
+
+    if compressed:
+        writer = CompressedPlyWriter(output_file, num_points)
+    else:
+        writer = PlyStreamWriter(output_file, num_points, properties)
+    if write_queue > 0:
+        writer = ThreadedWriter(writer, write_queue)
+
+    with writer:
+        buffer = allocate_vertices(min(chunk_size, num_points), properties)
+
+        for start, stop in iter_chunks(num_points, chunk_size):
+            points, colors, scales = sky_chunk(context, start, stop, profile)
+
+            vertices = buffer[:stop - start]
+            fill_gaussians(vertices, points, colors, scales=scales, seed=seed, first_index=start)
+            profile.lap('fill')
+            writer.write(vertices)
+            profile.lap('write')
+    profile.lap('close')
+
+    profile.finish(points=num_points, output=output_file)
     print(f"天空球已生成: {output_file}")
 
-if __name__ == "__main__":
+# 并行填充时每个工作进程的状态，由 _init_sky_worker 设置
+_WORKER = {}
+
+def _init_sky_worker(job):
+    """工作进程初始化：重新打开（或映射）共享的像素、积分图和查找表，映射输出文件的顶点区"""
+    context = dict(job['context'])
+    kind, *source = job['pixels']
+    context['pixels'] = np.load(source[0], mmap_mode='r') if kind == 'npy' else open_pixels(*source)
+    if job['sat'] is not None:
+        context['sat'] = job['sat'](context['pixels'])
+    if job['lookup'] is not None:
+        context['positions'], context['pixel_index'] = cached_sky_lookup(*job['lookup'])
+
+    _WORKER['context'] = context
+    _WORKER['seed'] = job['seed']
+    _WORKER['vertices'] = np.memmap(job['output'], dtype=vertex_dtype(job['properties']), mode='r+',
+                                    offset=job['offset'], shape=(context['num_points'],))
+
+def _fill_sky_range(start, stop):
+    """工作进程：生成 [start, stop) 区间的点并直接写入输出文件的对应记录"""
+    context, vertices = _WORKER['context'], _WORKER['vertices']
+    points, colors, scales = sky_chunk(context, start, stop)
+    fill_gaussians(vertices[start:stop], points, colors, scales=scales, seed=_WORKER['seed'], first_index=start)
+    vertices.flush()
+
+def generate_sky_sphere_parallel(hdri_path, output_file, num_points, radius, workers=None, seed=None,
+                                 cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, chunk_size=DEFAULT_CHUNK_SIZE,
+                                 raw_cache_dir=None, band_rows=DEFAULT_BAND_ROWS, exposure=0.0, tonemap='aces',
+                                 prefilter=False, adaptive=False, min_density=0.1, detail_resolution=256,
+                                 compact=False, normals=True, compressed=False, pixels=None):
+    """
+    多进程生成单个天空球：按最终大小预分配输出PLY，各工作进程通过 np.memmap 填充互不重叠的顶点区间
+    f_rest 噪声由计数器随机数按 (seed, 顶点序号) 生成，同一种子的输出与进程数无关、逐字节相同，
+    也与 generate_sky_sphere(seed=seed) 的结果相同；seed 为 None 时使用 0
+    解码到内存的像素和积分图先写到输出目录下的临时 .npy，工作进程以内存映射方式共享
+    只支持标准PLY输出（压缩格式需要按块排序和量化，请使用 generate_sky_sphere）
+    其余参数同 generate_sky_sphere
+    """
+    if compressed:
+        raise ValueError("并行填充不支持压缩格式")
+    seed = 0 if seed is None else seed
+    profile = start_profile('sky_parallel', input=hdri_path, workers=workers)
+    workers = workers or os.cpu_count() or 1
+    properties = gaussian_properties(compact, normals)
+
+    if pixels is None:
+        pixels = open_pixels(hdri_path, raw_cache_dir)
+    profile.lap('open')
+
+    context = sky_context(pixels, num_points, radius, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                          chunk_size=chunk_size, band_rows=band_rows, exposure=exposure, tonemap=tonemap,
+                          prefilter=prefilter, adaptive=adaptive, min_density=min_density,
+                          detail_resolution=detail_resolution, seed=seed)
+    profile.lap('setup')
+
+    vertices = create_ply_memmap(output_file, num_points, properties)
+    offset = getattr(vertices, 'offset', 0)
+    del vertices
+
+    work_dir = tempfile.mkdtemp(prefix='.skysphere-', dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        job = {'output': output_file, 'offset': offset, 'properties': properties, 'seed': seed,
+               'pixels': ('open', hdri_path, raw_cache_dir), 'sat': None, 'lookup': None}
+        if isinstance(pixels, np.ndarray) and not isinstance(pixels, np.memmap):
+            job['pixels'] = ('npy', os.path.join(work_dir, 'pixels.npy'))
+            np.save(job['pixels'][1], pixels)
+        if context['sat'] is not None:
+            job['sat'] = context['sat'].save(work_dir)
+        if context['positions'] is not None:
+            job['lookup'] = (cache_dir, num_points, radius, context['width'], context['height'],
+                             cache_max_bytes, chunk_size)
+        # 其余状态（标量和自适应布局）直接传给工作进程，大数组在进程内重新打开
+        job['context'] = {key: value for key, value in context.items()
+                          if key not in ('pixels', 'sat', 'positions', 'pixel_index')}
+        job['context'].update(sat=None, positions=None, pixel_index=None)
+        profile.lap('share')
+
+        # 每个进程分到约4个区间，负载更均衡；结果与分块方式无关
+        range_size = max(1, min(chunk_size, -(-num_points // (workers * 4))))
+        ranges = list(iter_chunks(num_points, range_size))
+        if ranges:
+            starts, stops = zip(*ranges)
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                     initializer=_init_sky_worker, initargs=(job,)) as pool:
+                for _ in pool.map(_fill_sky_range, starts, stops):
+                    pass
+        profile.lap('fill')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    profile.finish(points=num_points, output=output_file)
+    print(f"天空球已生成: {output_file}（{workers} 个进程并行填充）")
+
+# 输出与串行版本相同，增量构建时视为同一个生成器（见 build_manifest.generator_id）
+generate_sky_sphere_parallel.generator_id = f"{__name__}.generate_sky_sphere"
+
+def interactive_main():
+    """交互模式：提示输入参数，处理当前目录下的所有图像"""
     try:
         num_points = int(input("请输入点的数量 (默认 100000): ") or "100000")
     except ValueError:
@@ -199,3 +373,84 @@ if __name__ == "__main__":
                 print(f"处理 {img_file} 时出错: {str(e)}")
         
         print("所有图像处理完成。")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="将全景图/HDRI批量转换为3DGS天空球点云")
+    parser.add_argument("inputs", nargs="*", help="输入图像路径或通配符（如 'panos/*.jpg'），不提供时进入交互模式")
+    parser.add_argument("-o", "--output-dir", help="输出目录，默认与输入图像相同")
+    parser.add_argument("-n", "--num-points", type=int, default=100000, help="点的数量 (默认 100000)")
+    parser.add_argument("-r", "--radius", type=float, default=100.0, help="球体半径 (默认 100.0)")
+    parser.add_argument("--raw-cache-dir", help="原始像素缓存目录：压缩图像首次解码后保存为 .npy，之后按行带内存映射读取")
+    parser.add_argument("--band-rows", type=int, default=DEFAULT_BAND_ROWS, help=f"内存映射读取时每带的行数 (默认 {DEFAULT_BAND_ROWS})")
+    parser.add_argument("--exposure", type=float, default=0.0, help="HDR输入的曝光补偿，单位为档 (默认 0)")
+    parser.add_argument("--tonemap", choices=TONEMAP_OPERATORS, default="aces", help="HDR输入的色调映射算子 (默认 aces)")
+    parser.add_argument("--prefilter", action="store_true", help="取每个点覆盖范围内的平均颜色（积分图预过滤），减少低点数时的走样")
+    parser.add_argument("--adaptive", action="store_true", help="按图像细节分配点密度，细节少的区域用更少更大的高斯")
+    parser.add_argument("--min-density", type=float, default=0.1, help="自适应模式下平坦区域相对于最高密度的下限 (默认 0.1)")
+    parser.add_argument("--detail-resolution", type=int, default=256, help="自适应模式下细节图的网格行数 (默认 256)")
+    parser.add_argument("--compact", action="store_true", help="只写出0阶球谐属性（去掉 f_rest_*），文件约为原来的 1/4")
+    parser.add_argument("--no-normals", action="store_true", help="不写出法线字段")
+    parser.add_argument("--compressed", action="store_true", help="写出分块量化的压缩格式（*.compressed.ply，每点16字节）")
+    parser.add_argument("--profile", help="记录各阶段耗时，每个文件一行JSON写入该文件（'-' 为标准错误），也可以设置环境变量 SKYBOX_PROFILE")
+    parser.add_argument("--manifest", help="增量构建清单（JSON）：跳过输入、参数都未变化的输出，清理输入已删除或本次不再生成的输出")
+    parser.add_argument("-j", "--workers", type=int, help="并行进程数，默认为CPU核数")
+    parser.add_argument("--parallel-fill", action="store_true", help="逐个文件生成，每个文件由 -j 个进程并行填充预分配的输出（不支持 --compressed）")
+    parser.add_argument("--seed", type=int, help="随机种子：f_rest 噪声按顶点序号生成，输出可复现（--parallel-fill 未指定时为 0）")
+    parser.add_argument("--prefetch", type=int, help="单进程流水线模式：后台线程预读接下来的N个图像，同时后台写出（代替 -j 的多进程）")
+    parser.add_argument("--write-queue", type=int, default=2, help="流水线模式下后台写线程最多排队的块数 (默认 2)")
+    parser.add_argument("--cache-dir", help="几何/UV查找表缓存目录，相同参数和分辨率的全景图共享")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CACHE_MAX_BYTES / 1024 ** 2, help="缓存目录容量上限（MB），超出时淘汰最久未使用的条目")
+    parser.add_argument("--max-in-flight", type=int, help="同时处理的最大文件数，用于限制内存占用（默认等于进程数）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.inputs:
+        interactive_main()
+        return 0
+
+    enable_profiling(args.profile)
+    image_files = expand_inputs(args.inputs)
+    if not image_files:
+        print("没有找到匹配的图像文件。")
+        return 1
+
+    suffix = "_skysphere.compressed.ply" if args.compressed else "_skysphere.ply"
+    kwargs = {
+        "cache_dir": args.cache_dir,
+        "cache_max_bytes": int(args.cache_max_mb * 1024 ** 2),
+        "raw_cache_dir": args.raw_cache_dir,
+        "band_rows": args.band_rows,
+        "exposure": args.exposure,
+        "tonemap": args.tonemap,
+        "prefilter": args.prefilter,
+        "adaptive": args.adaptive,
+        "min_density": args.min_density,
+        "detail_resolution": args.detail_resolution,
+        "compact": args.compact,
+        "normals": not args.no_normals,
+        "compressed": args.compressed,
+        "seed": args.seed,
+    }
+    load = functools.partial(open_pixels, raw_cache_dir=args.raw_cache_dir)
+    manifest = BuildManifest(args.manifest) if args.manifest else None
+    if args.parallel_fill:
+        if args.compressed:
+            print("--parallel-fill 不支持 --compressed")
+            return 1
+        kwargs["workers"] = args.workers
+        _, failed = run_pipelined(generate_sky_sphere_parallel, image_files, suffix, load, args=(args.num_points, args.radius),
+                                  kwargs=kwargs, output_dir=args.output_dir, prefetch=1, manifest=manifest)
+    elif args.prefetch:
+        kwargs["write_queue"] = args.write_queue
+        _, failed = run_pipelined(generate_sky_sphere, image_files, suffix, load, args=(args.num_points, args.radius),
+                                  kwargs=kwargs, output_dir=args.output_dir, prefetch=args.prefetch,
+                                  manifest=manifest)
+    else:
+        _, failed = run_batch(generate_sky_sphere, image_files, suffix, args=(args.num_points, args.radius),
+                              kwargs=kwargs, output_dir=args.output_dir, workers=args.workers,
+                              max_in_flight=args.max_in_flight, manifest=manifest)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,180 +1,246 @@
 import numpy as np
-from PIL import Image
-import struct
 import os
 import math
 import glob
+import argparse
+import sys
 
-def generate_ground_plane(image_path, output_file, num_points, size):
+from batch_runner import expand_inputs, run_batch
+from build_manifest import BuildManifest
+from image_source import (DEFAULT_BAND_ROWS, box_filter_rgb, colors_to_f_dc, footprint_half_size, gather_rgb,
+                          open_pixels, summed_area_table)
+from profiling import enable_profiling, start_profile
+from ply_writer import DEFAULT_CHUNK_SIZE, PlyStreamWriter, allocate_vertices, fill_gaussians, gaussian_properties, iter_chunks
+from splat_compress import CompressedPlyWriter
+
+# 地面点的圆盘布局
+GROUND_LAYOUTS = ('vogel', 'rings')
+
+def ring_layout(num_points):
     """
-    将图像转换为XZ平面上的点云，使用内切圆
-    size: 平面的直径
+    同心圆环布局（从内到外），外圈点数更多
+    返回 (每环的半径比例, 每环点数, 每环第一个点的全局序号)
+    """
+    # 计算点数开方，用于均匀分布
+    sqrt_points = int(math.sqrt(num_points))
+
+    # 生成从0到1的半径比例
+    radius_ratio = np.arange(sqrt_points) / (sqrt_points - 1)
+
+    # 确定每个半径上的点数，外圈更多
+    points_in_ring = np.maximum(1, (radius_ratio * sqrt_points * 3.14).astype(np.int64))
+    ring_starts = np.concatenate(([0], np.cumsum(points_in_ring)[:-1]))
+    return radius_ratio, points_in_ring, ring_starts
+
+def ring_points(layout, start, stop):
+    """按全局序号 [start, stop) 计算环上点的半径比例和极角（闭式计算，不依赖其他点）"""
+    radius_ratio, points_in_ring, ring_starts = layout
+    idx = np.arange(start, stop)
+    ring = np.searchsorted(ring_starts, idx, side='right') - 1
+    theta_idx = idx - ring_starts[ring]
+    theta = 2 * math.pi * theta_idx / points_in_ring[ring]
+    return radius_ratio[ring], theta
+
+def lod_mass(radius, r0=1.0, power=2.0):
+    """
+    相对密度 ρ(r) = 1 (r <= r0)，(r0 / r) ** power (r > r0) 在半径 [0, radius] 圆盘上的积分（除以 2π）
+    r0 >= 1 时就是均匀分布的 radius² / 2
+    """
+    radius = np.asarray(radius, dtype=np.float64)
+    inner = 0.5 * np.minimum(radius, r0) ** 2
+    outer = np.maximum(radius, r0)
+    if power == 2:
+        tail = r0 * r0 * np.log(outer / r0)
+    else:
+        tail = r0 ** power * (outer ** (2 - power) - r0 ** (2 - power)) / (2 - power)
+    return inner + tail
+
+def lod_radius_for_mass(mass, r0=1.0, power=2.0):
+    """lod_mass 的闭式反函数：给定累积质量求半径"""
+    mass = np.asarray(mass, dtype=np.float64)
+    inner_mass = 0.5 * r0 * r0
+    excess = np.maximum(mass - inner_mass, 0.0)
+    if power == 2:
+        outer = r0 * np.exp(excess / (r0 * r0))
+    else:
+        outer = (r0 ** (2 - power) + excess * (2 - power) / r0 ** power) ** (1 / (2 - power))
+    return np.where(mass <= inner_mass, np.sqrt(2 * mass), outer)
+
+def lod_density(norm_radius, r0=1.0, power=2.0):
+    """半径 norm_radius 处相对于圆心的点密度"""
+    return np.minimum(1.0, (r0 / np.maximum(norm_radius, 1e-12)) ** power)
+
+def vogel_points(layout, start, stop):
+    """
+    Vogel（向日葵）圆盘布局：第 i 个点的累积质量为 (i + 0.5) / N，极角按黄金角递增
+    均匀密度时半径比例为 sqrt((i + 0.5) / N)；有距离衰减时按 lod_mass 的反函数闭式计算
+    """
+    golden_angle = math.pi * (3. - math.sqrt(5.))
+    idx = np.arange(start, stop, dtype=np.float64)
+    fraction = (idx + 0.5) / layout['total']
+    if layout['r0'] >= 1:
+        return np.sqrt(fraction), idx * golden_angle
+    mass = fraction * lod_mass(1.0, layout['r0'], layout['power'])
+    return lod_radius_for_mass(mass, layout['r0'], layout['power']), idx * golden_angle
+
+def disk_layout(num_points, layout='vogel', lod_r0=None, lod_power=2.0):
+    """
+    地面点的圆盘布局
+    layout: 'vogel'（默认，点数精确等于 num_points）或 'rings'（原有的同心圆环，点数由环数决定）
+    lod_r0: 距离衰减的起点（相对于圆盘半径的比例），为 None 时密度均匀；
+      此时 num_points 表示均匀分布时的点数，即圆心附近保持相同密度，外圈按 (r0 / r) ** lod_power 变稀
+    返回布局字典，total 为布局中的总点数
+    """
+    if layout == 'vogel':
+        r0 = 1.0 if lod_r0 is None else min(max(lod_r0, 1e-6), 1.0)
+        if lod_power <= 0:
+            raise ValueError(f"距离衰减指数必须大于0: {lod_power}")
+        total = num_points
+        if r0 < 1:
+            total = max(1, int(math.ceil(num_points * 2 * float(lod_mass(1.0, r0, lod_power)))))
+        return {'kind': 'vogel', 'total': total, 'r0': r0, 'power': lod_power}
+    if layout == 'rings':
+        if lod_r0 is not None:
+            raise ValueError("距离衰减只支持 vogel 布局")
+        rings = ring_layout(num_points)
+        return {'kind': 'rings', 'total': int(rings[1].sum()), 'rings': rings, 'r0': 1.0, 'power': lod_power}
+    raise ValueError(f"未知的地面布局: {layout}，可选 {', '.join(GROUND_LAYOUTS)}")
+
+def disk_points(layout, start, stop):
+    """按全局序号 [start, stop) 计算布局中点的半径比例和极角"""
+    if layout['kind'] == 'rings':
+        return ring_points(layout['rings'], start, stop)
+    return vogel_points(layout, start, stop)
+
+def ground_chunk(layout, start, stop, size, img_width, img_height):
+    """
+    计算一块点的平面坐标以及对应的图像像素坐标
+    返回 (x, z, img_x, img_y, valid)，valid 标记落在图像范围内的点
+    同心圆环布局保持原有行为，丢弃落在图像外的点；其他布局把像素坐标截断到图像内，所有点都有效
     """
-    # 加载地面图像
-    ground_img = Image.open(image_path)
-    img_width, img_height = ground_img.size
-    
     # 确定圆的中心和半径
     center_x = img_width / 2
     center_y = img_height / 2
     img_radius = min(center_x, center_y)
-    
-    # 计算点数开方，用于均匀分布
-    sqrt_points = int(math.sqrt(num_points))
-    actual_points = 0  # 用于统计实际生成的点数
-    
-    # 预先生成点位置
-    points = []
-    colors = []
-    
+
+    # 归一化半径从圆心到边缘
+    norm_radius, theta = disk_points(layout, start, stop)
+
+    # 转换为笛卡尔坐标
+    radius = norm_radius * size / 2
+    x = radius * np.cos(theta)
+    z = radius * np.sin(theta)
+
+    # 从极坐标映射到图像坐标
+    img_x = (center_x + norm_radius * img_radius * np.cos(theta)).astype(np.int64)
+    img_y = (center_y + norm_radius * img_radius * np.sin(theta)).astype(np.int64)
+
+    # 确保坐标在图像范围内
+    if layout['kind'] != 'rings':
+        img_x = np.clip(img_x, 0, img_width - 1)
+        img_y = np.clip(img_y, 0, img_height - 1)
+    valid = (img_x >= 0) & (img_x < img_width) & (img_y >= 0) & (img_y < img_height)
+    return x, z, img_x, img_y, valid
+
+def generate_ground_plane(image_path, output_file, num_points, size, chunk_size=DEFAULT_CHUNK_SIZE,
+                          raw_cache_dir=None, band_rows=DEFAULT_BAND_ROWS, prefilter=False,
+                          compact=False, normals=True, compressed=False, layout='vogel',
+                          lod_radius=None, lod_falloff=2.0):
+    """
+    将图像转换为XZ平面上的点云，使用内切圆
+    size: 平面的直径
+    按 chunk_size 个点一块生成、采样并追加写入，峰值内存与总点数无关
+    raw_cache_dir: 原始像素缓存目录，压缩格式首次解码后写入 .npy，之后按 band_rows 行一带内存映射读取
+    prefilter: 用积分图取每个点覆盖的环上单元内的平均颜色，点数远少于像素数时避免走样
+    compact: 只写出0阶球谐属性（去掉45个 f_rest_*），文件约缩小为原来的 1/4
+    normals: 是否写出法线字段
+    compressed: 写出按256点分块量化的压缩格式（每点16字节，只含0阶球谐），见 splat_compress
+    layout: 'vogel' 向日葵布局，点数精确等于 num_points；'rings' 为原有的同心圆环布局
+    lod_radius: 距离衰减半径（与 size 同单位），该半径内保持 num_points 对应的均匀密度，
+      之外密度按 (lod_radius / r) ** lod_falloff 下降，scale_0/scale_2 随点间距同步放大；None 表示不衰减
+    lod_falloff: 距离衰减指数，1 对应 1/r，2 对应 1/r²
+    设置环境变量 SKYBOX_PROFILE 时记录各阶段耗时，见 profiling
+    """
+    profile = start_profile('ground', input=image_path)
+
+    # 压缩格式只用到位置、f_dc、opacity、scale 和 rot，中间缓冲不需要 f_rest 和法线
+    properties = gaussian_properties(compact or compressed, normals and not compressed)
+
+    # 打开地面图像（未压缩格式、.npy 及原始像素缓存以内存映射方式按行带读取）
+    pixels = open_pixels(image_path, raw_cache_dir)
+    img_height, img_width = pixels.shape[:2]
+    profile.lap('open')
+
     # 使用极坐标方式生成点（从内到外生成圆）
-    for radius_idx in range(sqrt_points):
-        # 生成从0到1的半径比例
-        radius_ratio = radius_idx / (sqrt_points - 1)
-        
-        # 确定当前半径上的点数，外圈更多
-        points_in_ring = max(1, int(radius_ratio * sqrt_points * 3.14))
-        
-        for theta_idx in range(points_in_ring):
-            # 计算极坐标
-            theta = 2 * math.pi * theta_idx / points_in_ring
-            radius = radius_ratio * size / 2
-            
-            # 转换为笛卡尔坐标
-            x = radius * math.cos(theta)
-            z = radius * math.sin(theta)
-            
-            # 归一化半径从圆心到边缘
-            norm_radius = radius_ratio
-            
-            # 从极坐标映射到图像坐标
-            img_x = int(center_x + norm_radius * img_radius * math.cos(theta))
-            img_y = int(center_y + norm_radius * img_radius * math.sin(theta))
-            
-            # 确保坐标在图像范围内
-            if 0 <= img_x < img_width and 0 <= img_y < img_height:
-                # 获取图像像素颜色
-                pixel = ground_img.getpixel((img_x, img_y))
-                
-                # 如果图像是RGB格式
-                if len(pixel) == 3:
-                    r, g, b = pixel
-                # 如果图像是RGBA格式
-                elif len(pixel) == 4:
-                    r, g, b, a = pixel
-                else:
-                    r = g = b = pixel
-                
-                # 将RGB值归一化后乘以常数（基于示例数据）
-                r_norm = (r / 255.0) * 1.7
-                g_norm = (g / 255.0) * 1.7
-                b_norm = (b / 255.0) * 1.7
-                
-                points.append((x, 0, z))
-                colors.append((r_norm, g_norm, b_norm))
-                actual_points += 1
-    
-    # 准备PLY文件头部
-    ply_header = f"""ply
-format binary_little_endian 1.0
-element vertex {actual_points}
-property float x
-property float y
-property float z
-property float nxx
-property float ny
-property float nz
-property float f_dc_0
-property float f_dc_1
-property float f_dc_2
-property float f_rest_0
-property float f_rest_1
-property float f_rest_2
-property float f_rest_3
-property float f_rest_4
-property float f_rest_5
-property float f_rest_6
-property float f_rest_7
-property float f_rest_8
-property float f_rest_9
-property float f_rest_10
-property float f_rest_11
-property float f_rest_12
-property float f_rest_13
-property float f_rest_14
-property float f_rest_15
-property float f_rest_16
-property float f_rest_17
-property float f_rest_18
-property float f_rest_19
-property float f_rest_20
-property float f_rest_21
-property float f_rest_22
-property float f_rest_23
-property float f_rest_24
-property float f_rest_25
-property float f_rest_26
-property float f_rest_27
-property float f_rest_28
-property float f_rest_29
-property float f_rest_30
-property float f_rest_31
-property float f_rest_32
-property float f_rest_33
-property float f_rest_34
-property float f_rest_35
-property float f_rest_36
-property float f_rest_37
-property float f_rest_38
-property float f_rest_39
-property float f_rest_40
-property float f_rest_41
-property float f_rest_42
-property float f_rest_43
-property float f_rest_44
-property float opacity
-property float scale_0
-property float scale_1
-property float scale_2
-property float rot_0
-property float rot_1
-property float rot_2
-property float rot_3
-end_header
-"""
-
-    with open(output_file, 'wb') as f:
-        f.write(ply_header.encode('ascii'))
-        
-        for i in range(len(points)):
-            x, y, z = points[i]
-            r_norm, g_norm, b_norm = colors[i]
-            
-            # 写入顶点数据
-            # 位置 (x, y, z)
-            f.write(struct.pack('<fff', x, y, z))
-            
-            # 法线 (nx, ny, nz) - 向上的法线
-            f.write(struct.pack('<fff', 0.0, 1.0, 0.0))
-            
-            # 颜色 (f_dc_0, f_dc_1, f_dc_2)
-            f.write(struct.pack('<fff', r_norm, g_norm, b_norm))
-            
-            # f_rest_0到f_rest_44 - 设为小随机值
-            for _ in range(45):
-                f.write(struct.pack('<f', np.random.uniform(-0.03, 0.02)))
-            
-            # opacity, scale_0, scale_1, scale_2
-            # 这里将y轴方向的缩放比例缩小为原来的1/10，使其更扁平
-            f.write(struct.pack('<ffff', 4.6, 0.636, 0.0636, 0.636))
-            
-            # rot_0, rot_1, rot_2, rot_3
-            f.write(struct.pack('<ffff', 1.0, 0.0, 0.0, 0.0))
+    lod_r0 = None if lod_radius is None else lod_radius / (size / 2)
+    layout = disk_layout(num_points, layout, lod_r0, lod_falloff)
+    total = layout['total']
+    lod = layout['r0'] < 1
+    if lod:
+        print(f"距离衰减: 使用 {total} 个点（均匀分布需要 {num_points} 个）")
+
+    # 同心圆环布局会丢弃图像外的点，第一遍只计算几何，统计有效点数用于写入头部
+    actual_points = total
+    if layout['kind'] == 'rings':
+        actual_points = 0
+        for start, stop in iter_chunks(total, chunk_size):
+            actual_points += int(ground_chunk(layout, start, stop, size, img_width, img_height)[4].sum())
+        profile.lap('count')
 
+    # 预过滤：每个点覆盖的单元约为圆面积的 1/N，换算成图像上的方框半径
+    if prefilter:
+        sat = summed_area_table(pixels, band_rows)
+        img_radius = min(img_width, img_height) / 2
+        cell_size = img_radius * math.sqrt(math.pi / max(num_points if lod else total, 1))
+        half_size = int(footprint_half_size(cell_size))
+    profile.lap('setup')
+
+    if compressed:
+        writer = CompressedPlyWriter(output_file, actual_points)
+    else:
+        writer = PlyStreamWriter(output_file, actual_points, properties)
+
+    with writer:
+        buffer = allocate_vertices(min(chunk_size, actual_points), properties)
+
+        for start, stop in iter_chunks(total, chunk_size):
+            x, z, img_x, img_y, valid = ground_chunk(layout, start, stop, size, img_width, img_height)
+            count = int(valid.sum())
+            positions = np.column_stack((x[valid], np.zeros(count), z[valid]))
+
+            # 法线向上；将y轴方向的缩放比例缩小为原来的1/10，使其更扁平
+            scales = (0.636, 0.0636, 0.636)
+            if lod:
+                # 点间距与 1/sqrt(密度) 成正比，按对数尺度放大水平方向的高斯，保证外圈覆盖无空洞
+                norm_radius = np.hypot(x[valid], z[valid]) / (size / 2)
+                spread = -0.5 * np.log(lod_density(norm_radius, layout['r0'], layout['power']))
+                scales = np.column_stack((0.636 + spread, np.full(count, 0.0636), 0.636 + spread))
+                if prefilter:
+                    half_size = footprint_half_size(cell_size * np.exp(spread))
+            profile.lap('geometry')
+
+            # 获取图像像素颜色（预过滤时取覆盖范围内的平均颜色），将RGB值归一化后乘以常数（基于示例数据）
+            if prefilter:
+                sampled = box_filter_rgb(sat, img_y[valid], img_x[valid], half_size, half_size)
+            else:
+                sampled = gather_rgb(pixels, img_y[valid], img_x[valid], band_rows)
+            profile.lap('sample')
+            colors = colors_to_f_dc(sampled, hdr=pixels.dtype != np.uint8)
+            profile.lap('color')
+
+            vertices = buffer[:count]
+            fill_gaussians(vertices, positions, colors, normal=(0.0, 1.0, 0.0), scales=scales)
+            profile.lap('fill')
+            writer.write(vertices)
+            profile.lap('write')
+    profile.lap('close')
+
+    profile.finish(points=actual_points, output=output_file)
     print(f"地面平面已生成: {output_file}")
     print(f"实际使用了 {actual_points} 个点，平面直径为 {size}")
 
-if __name__ == "__main__":
+def interactive_main():
+    """交互模式：提示输入参数，处理当前目录下的所有图像"""
     try:
         num_points = int(input("请输入点的数量 (默认 40000): ") or "40000")
     except ValueError:
@@ -208,3 +274,58 @@ if __name__ == "__main__":
                 print(f"处理 {img_file} 时出错: {str(e)}")
         
         print("所有图像处理完成。")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="将图像批量转换为XZ平面上的3DGS地面点云")
+    parser.add_argument("inputs", nargs="*", help="输入图像路径或通配符（如 'tiles/*.png'），不提供时进入交互模式")
+    parser.add_argument("-o", "--output-dir", help="输出目录，默认与输入图像相同")
+    parser.add_argument("-n", "--num-points", type=int, default=40000, help="点的数量 (默认 40000)")
+    parser.add_argument("-s", "--size", type=float, default=200.0, help="平面直径 (默认 200.0)")
+    parser.add_argument("--raw-cache-dir", help="原始像素缓存目录：压缩图像首次解码后保存为 .npy，之后按行带内存映射读取")
+    parser.add_argument("--band-rows", type=int, default=DEFAULT_BAND_ROWS, help=f"内存映射读取时每带的行数 (默认 {DEFAULT_BAND_ROWS})")
+    parser.add_argument("--layout", choices=GROUND_LAYOUTS, default="vogel", help="点的圆盘布局：vogel 点数精确等于 -n，rings 为原有的同心圆环 (默认 vogel)")
+    parser.add_argument("--lod-radius", type=float, help="距离衰减半径（与 -s 同单位）：之内保持 -n 对应的密度，之外逐渐变稀，外圈高斯随之放大")
+    parser.add_argument("--lod-falloff", type=float, default=2.0, help="距离衰减指数，1 为 1/r，2 为 1/r² (默认 2)")
+    parser.add_argument("--prefilter", action="store_true", help="取每个点覆盖范围内的平均颜色（积分图预过滤），减少低点数时的走样")
+    parser.add_argument("--compact", action="store_true", help="只写出0阶球谐属性（去掉 f_rest_*），文件约为原来的 1/4")
+    parser.add_argument("--no-normals", action="store_true", help="不写出法线字段")
+    parser.add_argument("--compressed", action="store_true", help="写出分块量化的压缩格式（*.compressed.ply，每点16字节）")
+    parser.add_argument("--profile", help="记录各阶段耗时，每个文件一行JSON写入该文件（'-' 为标准错误），也可以设置环境变量 SKYBOX_PROFILE")
+    parser.add_argument("--manifest", help="增量构建清单（JSON）：跳过输入、参数都未变化的输出，清理输入已删除或本次不再生成的输出")
+    parser.add_argument("-j", "--workers", type=int, help="并行进程数，默认为CPU核数")
+    parser.add_argument("--max-in-flight", type=int, help="同时处理的最大文件数，用于限制内存占用（默认等于进程数）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.inputs:
+        interactive_main()
+        return 0
+
+    enable_profiling(args.profile)
+    image_files = expand_inputs(args.inputs)
+    if not image_files:
+        print("没有找到匹配的图像文件。")
+        return 1
+
+    _, failed = run_batch(
+        generate_ground_plane, image_files, "_ground.compressed.ply" if args.compressed else "_ground.ply",
+        args=(args.num_points, args.size),
+        kwargs={
+            "raw_cache_dir": args.raw_cache_dir,
+            "band_rows": args.band_rows,
+            "prefilter": args.prefilter,
+            "compact": args.compact,
+            "normals": not args.no_normals,
+            "compressed": args.compressed,
+            "layout": args.layout,
+            "lod_radius": args.lod_radius,
+            "lod_falloff": args.lod_falloff,
+        },
+        output_dir=args.output_dir, workers=args.workers, max_in_flight=args.max_in_flight,
+        manifest=BuildManifest(args.manifest) if args.manifest else None,
+    )
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import numpy as np
+import os
+import csv
+import json
+import hashlib
+import time
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from hdr_io import F_DC_SCALE
+from ply_reader import element_layout, read_ply_elements, read_ply_header
+from splat_compress import decode_compressed
+
+# 每个文件默认抽样的顶点数
+DEFAULT_SAMPLE_SIZE = 4096
+
+# 颜色缩略图的网格大小（行, 列）
+THUMBNAIL_SHAPE = (8, 16)
+
+# 索引中的列（CSV 按此顺序输出）
+CATALOG_FIELDS = [
+    'path', 'file_bytes', 'format', 'vertex_count', 'bytes_per_vertex', 'num_properties', 'layout',
+    'layout_hash', 'complete', 'sampled', 'bounding_radius', 'mean_rgb', 'thumbnail_hash', 'error',
+]
+
+def find_ply_files(roots):
+    """递归查找目录下的所有 .ply 文件（也可以直接给出文件），按路径排序"""
+    found = []
+    for root in roots:
+        if os.path.isfile(root):
+            found.append(root)
+            continue
+        for directory, _, files in os.walk(root):
+            found.extend(os.path.join(directory, name) for name in files if name.lower().endswith('.ply'))
+    return sorted(set(found))
+
+def _layout_name(names):
+    """根据属性名判断布局类型"""
+    if 'packed_position' in names:
+        return 'compressed'
+    if not all(name in names for name in ('x', 'y', 'z', 'f_dc_0', 'f_dc_1', 'f_dc_2')):
+        return 'other'
+    return 'sh3' if 'f_rest_44' in names else 'sh0'
+
+def color_thumbnail(positions, rgb):
+    """
+    把抽样点的颜色汇总成很小的缩略图（每格平均颜色，量化到16级）
+    立体点云（如天空球）按相对包围盒中心的方向做等距柱状投影；
+    扁平点云（如地面）按范围最大的两个坐标轴做平面网格
+    """
+    rows, cols = THUMBNAIL_SHAPE
+    center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+    extent = positions.max(axis=0) - positions.min(axis=0)
+    order = np.argsort(extent)
+    if extent[order[0]] > 0.1 * extent[order[2]]:
+        d = positions - center
+        r = np.maximum(np.linalg.norm(d, axis=1), 1e-12)
+        v = np.arccos(np.clip(d[:, 1] / r, -1.0, 1.0)) / np.pi
+        u = (np.arctan2(d[:, 2], d[:, 0]) / (2 * np.pi)) % 1.0
+    else:
+        a, b = order[2], order[1]
+        span = np.where(extent > 0, extent, 1.0)
+        u = (positions[:, a] - positions[:, a].min()) / span[a]
+        v = (positions[:, b] - positions[:, b].min()) / span[b]
+    cell = np.minimum((v * rows).astype(np.int64), rows - 1) * cols + np.minimum((u * cols).astype(np.int64), cols - 1)
+
+    counts = np.bincount(cell, minlength=rows * cols)
+    sums = np.stack([np.bincount(cell, weights=rgb[:, k], minlength=rows * cols) for k in range(3)], axis=1)
+    mean = sums / np.maximum(counts, 1)[:, None]
+    return (np.clip(mean, 0, 255).astype(np.uint8) >> 4).reshape(rows, cols, 3)
+
+def _sample_indices(count, sample_size):
+    """均匀间隔抽样（结果确定，同一文件每次抽到相同的顶点）"""
+    if count <= sample_size:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, sample_size).astype(np.int64))
+
+def catalog_entry(ply_path, sample_size=DEFAULT_SAMPLE_SIZE):
+    """只读取头部和抽样的顶点，生成一条索引记录；出错时记录错误信息"""
+    entry = dict.fromkeys(CATALOG_FIELDS, '')
+    entry['path'] = ply_path
+    try:
+        entry['file_bytes'] = os.path.getsize(ply_path)
+        header = read_ply_header(ply_path)
+        entry['format'] = header['format']
+        vertex = next((e for e in header['elements'] if e[0] == 'vertex'), None)
+        if vertex is None:
+            raise ValueError("没有 vertex 元素")
+        names = [name for name, _ in vertex[2]]
+        entry['vertex_count'] = vertex[1]
+        entry['num_properties'] = len(names)
+        entry['layout'] = _layout_name(names)
+        entry['layout_hash'] = hashlib.sha1(' '.join(f'{t}:{n}' for n, t in vertex[2]).encode('utf-8')).hexdigest()[:12]
+        if header['format'] == 'ascii':
+            return entry
+
+        # 只定位需要的元素，网格文件中 vertex 之后的 face 等 list 元素不影响读取
+        element_names = ('chunk', 'vertex') if entry['layout'] == 'compressed' else ('vertex',)
+        layout = element_layout(header, element_names)
+        entry['bytes_per_vertex'] = layout['vertex'][1].itemsize
+        end = max(offset + dtype.itemsize * count for offset, dtype, count in layout.values())
+        entry['complete'] = entry['file_bytes'] >= end
+        if not entry['complete'] or entry['layout'] == 'other':
+            return entry
+
+        elements = read_ply_elements(ply_path, header, names=element_names)
+        indices = _sample_indices(vertex[1], sample_size)
+        if entry['layout'] == 'compressed':
+            decoded = decode_compressed(elements['chunk'], elements['vertex'], indices)
+            positions, f_dc = decoded['positions'], decoded['f_dc']
+        else:
+            sample = elements['vertex'][indices]
+            positions = np.column_stack([sample[axis] for axis in ('x', 'y', 'z')]).astype(np.float64)
+            f_dc = np.column_stack([sample[f'f_dc_{k}'] for k in range(3)]).astype(np.float64)
+        # 颜色按本项目的换算（f_dc / 1.7）还原为 0-255，不同布局的同一份数据得到相同的缩略图
+        rgb = f_dc / F_DC_SCALE * 255.0
+
+        entry['sampled'] = len(indices)
+        if len(indices):
+            finite = np.isfinite(positions).all(axis=1) & np.isfinite(rgb).all(axis=1)
+            positions, rgb = positions[finite], np.clip(rgb[finite], 0, 255)
+        if len(positions):
+            entry['bounding_radius'] = round(float(np.sqrt((positions ** 2).sum(axis=1)).max()), 4)
+            entry['mean_rgb'] = ' '.join(str(int(round(c))) for c in rgb.mean(axis=0))
+            entry['thumbnail_hash'] = hashlib.sha1(color_thumbnail(positions, rgb).tobytes()).hexdigest()[:16]
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+def build_catalog(roots, output_path, workers=None, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    并行扫描目录中的所有PLY文件并写出索引（.json 输出JSON数组，其他扩展名输出CSV）
+    读取以I/O为主，使用线程池；返回索引记录列表
+    """
+    files = find_ply_files(roots)
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    print(f"找到 {len(files)} 个PLY文件，使用 {workers} 个线程扫描...")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = list(pool.map(lambda path: catalog_entry(path, sample_size), files))
+    elapsed = time.perf_counter() - start
+
+    if output_path.lower().endswith('.json'):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+    else:
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CATALOG_FIELDS)
+            writer.writeheader()
+            writer.writerows(entries)
+
+    errors = sum(1 for entry in entries if entry['error'])
+    rate = len(entries) / elapsed if elapsed > 0 else 0.0
+    print(f"索引已保存到 {output_path}: {len(entries)} 个文件，出错 {errors} 个，用时 {elapsed:.2f}s（{rate:.1f} 个/s）")
+    return entries
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="并行扫描目录中的PLY文件，生成 CSV/JSON 索引")
+    parser.add_argument("roots", nargs="+", help="要扫描的目录或PLY文件")
+    parser.add_argument("-o", "--output", default="ply_catalog.csv", help="索引文件，.json 输出JSON，否则输出CSV (默认 ply_catalog.csv)")
+    parser.add_argument("-j", "--workers", type=int, help="线程数，默认为CPU核数的4倍（最多32）")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE, help=f"每个文件抽样的顶点数 (默认 {DEFAULT_SAMPLE_SIZE})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    entries = build_catalog(args.roots, args.output, args.workers, args.sample_size)
+    return 1 if any(entry['error'] for entry in entries) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
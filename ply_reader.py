@@ -0,0 +1,109 @@
+import numpy as np
+
+from ply_writer import PLY_TYPES
+
+# PLY 类型的别名（部分工具写出 float32/uint8 等形式）
+PLY_TYPE_ALIASES = {
+    'int8': 'char', 'uint8': 'uchar', 'int16': 'short', 'uint16': 'ushort',
+    'int32': 'int', 'uint32': 'uint', 'float32': 'float', 'float64': 'double',
+}
+
+def read_ply_header(ply_path):
+    """
+    以二进制方式读取一次PLY头部（只打开一次文件，按 latin1 解码，不会因编码失败）
+    返回 {'format', 'comments', 'elements': [(名称, 数量, [(属性, 类型), ...]), ...], 'header_size', 'text'}
+    """
+    with open(ply_path, 'rb') as f:
+        first = f.readline()
+        if first.strip() != b'ply':
+            raise ValueError(f"{ply_path} 不是PLY文件")
+
+        header = {'format': None, 'comments': [], 'elements': []}
+        lines = [first.decode('latin1').strip()]
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{ply_path} 的PLY头部没有 end_header")
+            lines.append(line.decode('latin1').strip())
+            tokens = line.decode('latin1').split()
+            if not tokens:
+                continue
+            keyword = tokens[0]
+            if keyword == 'end_header':
+                break
+            if keyword == 'format':
+                header['format'] = tokens[1]
+            elif keyword in ('comment', 'obj_info'):
+                header['comments'].append(line.decode('latin1').strip()[len(keyword) + 1:])
+            elif keyword == 'element':
+                header['elements'].append((tokens[1], int(tokens[2]), []))
+            elif keyword == 'property':
+                if not header['elements']:
+                    raise ValueError(f"{ply_path} 的属性出现在 element 之前")
+                if tokens[1] == 'list':
+                    header['elements'][-1][2].append((tokens[4], 'list'))
+                else:
+                    ply_type = PLY_TYPE_ALIASES.get(tokens[1], tokens[1])
+                    header['elements'][-1][2].append((tokens[2], ply_type))
+        header['header_size'] = f.tell()
+    header['text'] = '\n'.join(lines)
+    return header
+
+def element_dtype(properties, ply_format='binary_little_endian'):
+    """根据属性列表和文件格式构建结构化 dtype；不支持 list 属性"""
+    byte_order = '>' if ply_format == 'binary_big_endian' else '<'
+    fields = []
+    for name, ply_type in properties:
+        if ply_type not in PLY_TYPES:
+            raise ValueError(f"不支持的PLY属性类型: {ply_type}（属性 {name}）")
+        fields.append((name, np.dtype(PLY_TYPES[ply_type]).newbyteorder(byte_order)))
+    return np.dtype(fields)
+
+def element_layout(header, names=None):
+    """
+    计算二进制PLY中各元素数据区的位置
+    names: 只需要的元素名（None 表示全部）；只计算到其中最后一个元素为止，
+           之后的元素（例如网格文件中带 list 属性的 face）不影响结果
+    返回 {元素名: (文件内偏移, 结构化 dtype, 记录数)}
+    """
+    if header['format'] not in ('binary_little_endian', 'binary_big_endian'):
+        raise ValueError(f"只支持二进制PLY，当前格式为 {header['format']}")
+    wanted = set(name for name, _, _ in header['elements']) if names is None else set(names)
+    missing = wanted - set(name for name, _, _ in header['elements'])
+    if missing:
+        raise ValueError(f"PLY中没有 {', '.join(sorted(missing))} 元素")
+
+    layout = {}
+    offset = header['header_size']
+    for name, count, properties in header['elements']:
+        if wanted <= set(layout):
+            break
+        if any(ply_type == 'list' for _, ply_type in properties):
+            # list 属性的记录长度可变，无法定位其后元素的数据区
+            raise ValueError(f"元素 {name} 含有 list 属性，无法定位其后的 {', '.join(sorted(wanted - set(layout)))} 元素")
+        dtype = element_dtype(properties, header['format'])
+        layout[name] = (offset, dtype, count)
+        offset += count * dtype.itemsize
+    return {name: layout[name] for name in layout if name in wanted}
+
+def read_ply_elements(ply_path, header=None, mode='r', names=None):
+    """
+    把二进制PLY中的各个元素映射为结构化 memmap，返回 {元素名: 记录数组}
+    mode: 'r' 只读，'r+' 可以原地修改文件中的数据
+    names: 只映射这些元素，见 element_layout；需要的元素及其之前的元素只能有定长属性（不含 list）
+    """
+    header = header or read_ply_header(ply_path)
+    elements = {}
+    for name, (offset, dtype, count) in element_layout(header, names).items():
+        if count == 0:
+            elements[name] = np.empty(0, dtype=dtype)
+        else:
+            elements[name] = np.memmap(ply_path, dtype=dtype, mode=mode, offset=offset, shape=(count,))
+    return elements
+
+def open_ply_vertices(ply_path, mode='r'):
+    """
+    把PLY的 vertex 元素映射为结构化 memmap（字段名和类型来自头部）
+    任意范围的顶点都可以直接切片访问，不需要读取整个文件
+    """
+    return read_ply_elements(ply_path, mode=mode, names=('vertex',))['vertex']
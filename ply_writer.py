@@ -0,0 +1,266 @@
+import numpy as np
+import queue
+import threading
+
+# PLY 标量类型与 NumPy 小端类型的对应关系
+PLY_TYPES = {
+    'char': 'i1',
+    'uchar': 'u1',
+    'short': '<i2',
+    'ushort': '<u2',
+    'int': '<i4',
+    'uint': '<u4',
+    'float': '<f4',
+    'double': '<f8',
+}
+
+# 分块生成时每块的默认点数，决定流式写入的峰值内存
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+# 3DGS 点云的标准属性（62个float），与历史生成的文件保持一致（包括 nxx 的写法）
+GAUSSIAN_PROPERTIES = (
+    ['x', 'y', 'z', 'nxx', 'ny', 'nz', 'f_dc_0', 'f_dc_1', 'f_dc_2']
+    + [f'f_rest_{i}' for i in range(45)]
+    + ['opacity', 'scale_0', 'scale_1', 'scale_2', 'rot_0', 'rot_1', 'rot_2', 'rot_3']
+)
+
+# 只保留0阶球谐（f_dc）的紧凑属性集，每个点 68 字节，3DGS 查看器同样可以读取
+SH0_PROPERTIES = [name for name in GAUSSIAN_PROPERTIES if not name.startswith('f_rest_')]
+
+_NORMAL_PROPERTIES = ('nxx', 'ny', 'nz')
+
+def gaussian_properties(compact=False, normals=True):
+    """
+    选择3DGS输出的属性集
+    compact: 只写出0阶球谐属性，去掉45个 f_rest_*
+    normals: 是否保留（全为常量的）法线字段
+    """
+    properties = SH0_PROPERTIES if compact else GAUSSIAN_PROPERTIES
+    if not normals:
+        properties = [name for name in properties if name not in _NORMAL_PROPERTIES]
+    return list(properties)
+
+def normalize_properties(properties):
+    """
+    把属性列表统一成 [(名称, PLY类型), ...]
+    只给出名称的属性默认为 float
+    """
+    normalized = []
+    for prop in properties:
+        if isinstance(prop, str):
+            normalized.append((prop, 'float'))
+        else:
+            name, ply_type = prop
+            if ply_type not in PLY_TYPES:
+                raise ValueError(f"不支持的PLY属性类型: {ply_type}")
+            normalized.append((name, ply_type))
+    return normalized
+
+def properties_from_dtype(dtype):
+    """根据结构化 dtype 反推属性列表，用于重写已有的PLY数据"""
+    reverse = {np.dtype(v).newbyteorder('<'): k for k, v in PLY_TYPES.items()}
+    properties = []
+    for name in dtype.names:
+        field = dtype.fields[name][0].newbyteorder('<')
+        if field not in reverse:
+            raise ValueError(f"字段 {name} 的类型 {field} 无法写入PLY")
+        properties.append((name, reverse[field]))
+    return properties
+
+def vertex_dtype(properties):
+    """根据属性列表构建小端结构化 dtype，字段紧密排列，与PLY二进制记录一一对应"""
+    return np.dtype([(name, PLY_TYPES[ply_type]) for name, ply_type in normalize_properties(properties)])
+
+def ply_header(num_vertices, properties, element='vertex'):
+    """生成 binary_little_endian 格式的PLY头部（bytes）"""
+    return ply_elements_header([(element, num_vertices, properties)])
+
+def ply_elements_header(elements, comments=()):
+    """
+    生成包含多个元素的 binary_little_endian PLY头部（bytes）
+    elements: [(元素名, 数量, 属性列表), ...]，按文件中的存放顺序给出
+    """
+    lines = ['ply', 'format binary_little_endian 1.0']
+    lines.extend(f'comment {comment}' for comment in comments)
+    for element, count, properties in elements:
+        lines.append(f'element {element} {count}')
+        for name, ply_type in normalize_properties(properties):
+            lines.append(f'property {ply_type} {name}')
+    lines.append('end_header')
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+def allocate_vertices(num_vertices, properties):
+    """预分配顶点记录数组"""
+    return np.empty(num_vertices, dtype=vertex_dtype(properties))
+
+def field_block(vertices, first, last):
+    """
+    返回从字段 first 到 last（包含）的二维视图，形状为 (N, 字段数)
+    要求这些字段类型相同且在记录中连续，写入视图即写入原数组（包括 memmap）
+    """
+    names = vertices.dtype.names
+    start, stop = names.index(first), names.index(last) + 1
+    base, offset = vertices.dtype.fields[first]
+    for k, name in enumerate(names[start:stop]):
+        field, field_offset = vertices.dtype.fields[name]
+        if field != base or field_offset != offset + k * base.itemsize:
+            raise ValueError(f"字段 {first}..{last} 不是连续的同类型字段")
+    return np.ndarray(
+        shape=(len(vertices), stop - start),
+        dtype=base,
+        buffer=vertices,
+        offset=offset,
+        strides=(vertices.dtype.itemsize, base.itemsize),
+    )
+
+def rest_noise(seed, first_index, count):
+    """
+    由计数器随机数（Philox）生成 count 个顶点的 f_rest 噪声，范围与 np.random.uniform(-0.03, 0.02) 相同
+    第 i 个顶点固定使用计数器 12*i 起的 48 个 64 位随机数中的前 45 个，
+    结果只取决于 seed 和顶点序号，与分块方式和进程数无关
+    """
+    bits = np.random.Philox(key=seed, counter=12 * first_index).random_raw(48 * count).reshape(count, 48)[:, :45]
+    return (bits >> np.uint64(11)) * (0.05 / 2 ** 53) - 0.03
+
+def fill_gaussians(vertices, positions, colors, normal=(0.0, 0.0, 0.0), opacity=4.6,
+                   scales=(0.636, 0.636, 0.636), rotation=(1.0, 0.0, 0.0, 0.0), seed=None, first_index=0):
+    """
+    按 gaussian_properties 给出的布局填充一批3DGS顶点
+    f_rest_* 填充小随机值，其余字段为常量；布局中没有的法线/f_rest 字段直接跳过
+    seed: 给出时 f_rest 噪声由 rest_noise(seed, first_index, ...) 生成（first_index 为这批顶点的起始序号），
+          否则使用全局随机数
+    """
+    count = len(vertices)
+    names = vertices.dtype.names
+    field_block(vertices, 'x', 'z')[:] = positions                # 位置 (x, y, z)
+    if 'nxx' in names:
+        field_block(vertices, 'nxx', 'nz')[:] = normal            # 法线 (nx, ny, nz)
+    field_block(vertices, 'f_dc_0', 'f_dc_2')[:] = colors         # 颜色 (f_dc_0, f_dc_1, f_dc_2)
+    if 'f_rest_0' in names:
+        if seed is None:
+            noise = np.random.uniform(-0.03, 0.02, size=(count, 45))
+        else:
+            noise = rest_noise(seed, first_index, count)
+        field_block(vertices, 'f_rest_0', 'f_rest_44')[:] = noise
+    vertices['opacity'] = opacity
+    field_block(vertices, 'scale_0', 'scale_2')[:] = scales       # scale_0, scale_1, scale_2
+    field_block(vertices, 'rot_0', 'rot_3')[:] = rotation         # rot_0, rot_1, rot_2, rot_3
+
+def iter_chunks(total, chunk_size):
+    """把 [0, total) 切分成若干 (start, stop) 区间，用于分块生成和流式写入"""
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total)
+
+def write_ply(output_file, vertices, properties):
+    """写入头部后把整个记录数组一次性写入文件"""
+    dtype = vertex_dtype(properties)
+    if vertices.dtype != dtype:
+        vertices = vertices.astype(dtype)
+    with open(output_file, 'wb') as f:
+        f.write(ply_header(len(vertices), properties))
+        vertices.tofile(f)
+
+class PlyStreamWriter:
+    """
+    流式写入标准PLY：先写头部，之后按块追加顶点记录
+    与 splat_compress.CompressedPlyWriter 接口相同，生成脚本可以直接切换输出格式
+    """
+
+    def __init__(self, output_file, num_vertices, properties):
+        self.num_vertices = num_vertices
+        self.dtype = vertex_dtype(properties)
+        self.written = 0
+        self._file = open(output_file, 'wb')
+        self._file.write(ply_header(num_vertices, properties))
+
+    def write(self, vertices):
+        vertices.tofile(self._file)
+        self.written += len(vertices)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.written != self.num_vertices:
+            raise ValueError(f"写入了 {self.written} 个顶点，与头部声明的 {self.num_vertices} 个不一致")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+        else:
+            self.close()
+
+class ThreadedWriter:
+    """
+    把写出放到后台线程：write 复制顶点块后放入有界队列即返回，后台线程依次交给被包装的写出器
+    （PlyStreamWriter 或 CompressedPlyWriter），文件I/O与下一块的生成重叠
+    队列满时 write 阻塞，额外内存不超过 max_pending 个块；后台写出出错时在下一次 write/close 抛出
+    """
+
+    def __init__(self, writer, max_pending=2):
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def written(self):
+        return self.writer.written
+
+    def _run(self):
+        while True:
+            vertices = self._queue.get()
+            if vertices is None:
+                return
+            # 出错后继续取出队列中的块（丢弃），避免生产者阻塞
+            if self._error is None:
+                try:
+                    self.writer.write(vertices)
+                except BaseException as e:
+                    self._error = e
+
+    def _stop(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def write(self, vertices):
+        if self._error is not None:
+            raise self._error
+        # 生成脚本会复用缓冲区，入队前必须复制
+        self._queue.put(np.array(vertices))
+
+    def close(self):
+        self._stop()
+        if self._error is not None:
+            self.writer.__exit__(type(self._error), self._error, None)
+            raise self._error
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._stop()
+            self.writer.__exit__(exc_type, exc, tb)
+        else:
+            self.close()
+
+def create_ply_memmap(output_file, num_vertices, properties):
+    """
+    按最终大小预分配PLY文件，写入头部后返回顶点区的 np.memmap
+    适用于超出内存的输出：调用方按范围填充记录，最后 flush 即可
+    """
+    header = ply_header(num_vertices, properties)
+    dtype = vertex_dtype(properties)
+    with open(output_file, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + num_vertices * dtype.itemsize)
+    if num_vertices == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(output_file, dtype=dtype, mode='r+', offset=len(header), shape=(num_vertices,))
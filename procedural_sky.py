@@ -0,0 +1,162 @@
+import numpy as np
+import math
+import argparse
+import sys
+import time
+
+from hdr_io import TONEMAP_OPERATORS, hdr_to_f_dc, srgb_decode
+from pano_to_skybox import fibonacci_sphere
+from ply_writer import DEFAULT_CHUNK_SIZE, PlyStreamWriter, allocate_vertices, fill_gaussians, gaussian_properties, iter_chunks
+from RGB_to_skybox import parse_rgb_input
+from splat_compress import CompressedPlyWriter
+
+# 天空亮度模型：gradient 只用颜色渐变，cie 额外乘以 CIE 晴天亮度分布
+SKY_MODELS = ('gradient', 'cie')
+
+# CIE 标准晴天（类型12）的 Perez 亮度分布系数
+_CIE_CLEAR = (-1.0, -0.32, 10.0, -3.0, 0.45)
+
+# 程序化天空的默认参数，颜色为 0-255 的 sRGB 值，角度单位为度
+DEFAULT_SKY = {
+    'zenith': (58, 111, 216),
+    'horizon': (207, 227, 247),
+    'ground': (107, 107, 107),
+    'gradient_exponent': 0.5,
+    'sun_azimuth': 135.0,
+    'sun_elevation': 30.0,
+    'sun_size': 0.5,
+    'sun_color': (255, 244, 214),
+    'sun_intensity': 20.0,
+    'sun_glow': 8.0,
+    'sun_glow_intensity': 0.5,
+    'model': 'gradient',
+}
+
+def sun_direction(azimuth, elevation):
+    """由方位角和高度角（度）计算太阳方向的单位向量（y 轴向上，方位角从 +x 轴向 +z 轴旋转）"""
+    azimuth, elevation = math.radians(azimuth), math.radians(elevation)
+    return np.array([math.cos(elevation) * math.cos(azimuth), math.sin(elevation), math.cos(elevation) * math.sin(azimuth)])
+
+def _linear_color(rgb):
+    return srgb_decode(np.asarray(rgb, dtype=np.float64) / 255.0)
+
+def cie_relative_luminance(directions, sun):
+    """
+    CIE 晴天亮度分布（Perez 公式），以天顶亮度归一化
+    L = (1 + a e^(b / cosθ)) (1 + c e^(dγ) + e cos²γ)，θ 为天顶角，γ 为与太阳的夹角；地平线以下按地平线处理
+    """
+    a, b, c, d, e = _CIE_CLEAR
+    cos_theta = np.maximum(directions[:, 1], 1e-2)
+    cos_gamma = np.clip(directions @ sun, -1.0, 1.0)
+    gamma = np.arccos(cos_gamma)
+
+    def perez(cos_t, gam, cos_g):
+        return (1 + a * np.exp(b / cos_t)) * (1 + c * np.exp(d * gam) + e * cos_g * cos_g)
+
+    sun_zenith = math.acos(min(max(sun[1], -1.0), 1.0))
+    zenith = perez(1.0, sun_zenith, math.cos(sun_zenith))
+    return perez(cos_theta, gamma, cos_gamma) / zenith
+
+def sky_colors(directions, params):
+    """
+    按方向批量计算天空的线性RGB颜色（可以大于1）
+    directions: (N, 3) 单位向量；params: 参数字典，缺省项取 DEFAULT_SKY
+    - 天顶/地平线/地面之间按高度渐变，gradient_exponent 越小地平线颜色带越窄
+    - 太阳圆盘（角半径 sun_size）及指数衰减的光晕（角度尺度 sun_glow）
+    - model='cie' 时天空部分再乘以 CIE 晴天亮度分布
+    """
+    params = dict(DEFAULT_SKY, **params)
+    y = directions[:, 1:2]
+    zenith, horizon, ground = (_linear_color(params[k]) for k in ('zenith', 'horizon', 'ground'))
+
+    up = np.power(np.clip(y, 0.0, 1.0), params['gradient_exponent'])
+    down = np.power(np.clip(-y, 0.0, 1.0), params['gradient_exponent'])
+    colors = np.where(y >= 0, horizon + (zenith - horizon) * up, horizon + (ground - horizon) * down)
+
+    sun = sun_direction(params['sun_azimuth'], params['sun_elevation'])
+    if params['model'] == 'cie':
+        colors = np.where(y >= 0, colors * cie_relative_luminance(directions, sun)[:, None], colors)
+    elif params['model'] != 'gradient':
+        raise ValueError(f"未知的天空模型: {params['model']}，可选 {', '.join(SKY_MODELS)}")
+
+    # 太阳圆盘和光晕（地平线以下被地面遮挡）
+    angle = np.degrees(np.arccos(np.clip(directions @ sun, -1.0, 1.0)))
+    sun_color = _linear_color(params['sun_color'])
+    glow = params['sun_glow_intensity'] * np.exp(-angle / max(params['sun_glow'], 1e-6))
+    disk = np.where(angle <= params['sun_size'], params['sun_intensity'], 0.0)
+    visible = (y[:, 0] >= 0)
+    colors = colors + (sun_color * ((glow + disk) * visible)[:, None])
+    return colors
+
+def generate_procedural_sky(output_file, num_points=100000, radius=100.0, params=None,
+                            exposure=0.0, tonemap='linear', chunk_size=DEFAULT_CHUNK_SIZE,
+                            compact=False, normals=True, compressed=False):
+    """
+    不依赖模板或全景图，直接在斐波那契球面点上按方向计算颜色并流式写出天空球
+    params: 天空参数字典，见 DEFAULT_SKY
+    exposure, tonemap: 线性颜色转换为 f_dc 时的曝光补偿（档）和色调映射算子；
+      默认 'linear' 只做截断，地平线和天顶颜色与输入的 sRGB 值一致
+    compact, normals, compressed: 输出布局，同 generate_sky_sphere
+    """
+    params = params or {}
+    properties = gaussian_properties(compact or compressed, normals and not compressed)
+
+    if compressed:
+        writer = CompressedPlyWriter(output_file, num_points)
+    else:
+        writer = PlyStreamWriter(output_file, num_points, properties)
+
+    with writer:
+        buffer = allocate_vertices(min(chunk_size, num_points), properties)
+        for start, stop in iter_chunks(num_points, chunk_size):
+            points = fibonacci_sphere(samples=num_points, radius=radius, start=start, stop=stop)
+            colors = hdr_to_f_dc(sky_colors(points / radius, params), exposure, tonemap)
+
+            vertices = buffer[:stop - start]
+            fill_gaussians(vertices, points, colors)
+            writer.write(vertices)
+
+    print(f"程序化天空已生成: {output_file}")
+
+def _color_arg(value):
+    rgb = parse_rgb_input(value)
+    if rgb is None:
+        raise argparse.ArgumentTypeError(f"无法识别的RGB格式: {value}")
+    return rgb
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="按参数程序化生成渐变/太阳天空球（不需要模板和全景图）")
+    parser.add_argument("output", help="输出PLY文件")
+    parser.add_argument("-n", "--num-points", type=int, default=100000, help="点的数量 (默认 100000)")
+    parser.add_argument("-r", "--radius", type=float, default=100.0, help="球体半径 (默认 100.0)")
+    parser.add_argument("--model", choices=SKY_MODELS, default=DEFAULT_SKY['model'], help="天空亮度模型 (默认 gradient)")
+    parser.add_argument("--zenith", type=_color_arg, default=DEFAULT_SKY['zenith'], help="天顶颜色，如 '58,111,216' 或 '#3A6FD8'")
+    parser.add_argument("--horizon", type=_color_arg, default=DEFAULT_SKY['horizon'], help="地平线颜色")
+    parser.add_argument("--ground", type=_color_arg, default=DEFAULT_SKY['ground'], help="地面（下半球）颜色")
+    parser.add_argument("--gradient-exponent", type=float, default=DEFAULT_SKY['gradient_exponent'], help="渐变指数，越小地平线颜色带越窄 (默认 0.5)")
+    parser.add_argument("--sun-azimuth", type=float, default=DEFAULT_SKY['sun_azimuth'], help="太阳方位角（度） (默认 135)")
+    parser.add_argument("--sun-elevation", type=float, default=DEFAULT_SKY['sun_elevation'], help="太阳高度角（度） (默认 30)")
+    parser.add_argument("--sun-size", type=float, default=DEFAULT_SKY['sun_size'], help="太阳圆盘的角半径（度），0 表示不画太阳 (默认 0.5)")
+    parser.add_argument("--sun-color", type=_color_arg, default=DEFAULT_SKY['sun_color'], help="太阳颜色")
+    parser.add_argument("--sun-intensity", type=float, default=DEFAULT_SKY['sun_intensity'], help="太阳圆盘的亮度倍数 (默认 20)")
+    parser.add_argument("--sun-glow", type=float, default=DEFAULT_SKY['sun_glow'], help="太阳光晕的衰减角度（度） (默认 8)")
+    parser.add_argument("--sun-glow-intensity", type=float, default=DEFAULT_SKY['sun_glow_intensity'], help="太阳光晕的亮度倍数，0 表示没有光晕 (默认 0.5)")
+    parser.add_argument("--exposure", type=float, default=0.0, help="曝光补偿，单位为档 (默认 0)")
+    parser.add_argument("--tonemap", choices=TONEMAP_OPERATORS, default="linear", help="色调映射算子 (默认 linear)")
+    parser.add_argument("--compact", action="store_true", help="只写出0阶球谐属性（去掉 f_rest_*），文件约为原来的 1/4")
+    parser.add_argument("--no-normals", action="store_true", help="不写出法线字段")
+    parser.add_argument("--compressed", action="store_true", help="写出分块量化的压缩格式（每点16字节）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {name: getattr(args, name) for name in DEFAULT_SKY}
+    start = time.perf_counter()
+    generate_procedural_sky(args.output, args.num_points, args.radius, params,
+                            exposure=args.exposure, tonemap=args.tonemap,
+                            compact=args.compact, normals=not args.no_normals, compressed=args.compressed)
+    print(f"用时 {time.perf_counter() - start:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，峰值内存记为不可用
+    resource = None
+
+# 设置该环境变量即开启分阶段计时：值为 JSON Lines 输出文件路径，'-' 表示输出到标准错误
+PROFILE_ENV = 'SKYBOX_PROFILE'
+
+class _NullProfile:
+    """未开启时使用的空实现，所有调用都直接返回"""
+
+    def lap(self, stage):
+        pass
+
+    def finish(self, **info):
+        pass
+
+NULL_PROFILE = _NullProfile()
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节；不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+class StageProfile:
+    """
+    分阶段计时：每次调用 lap(stage) 把距上一次 lap 的墙钟时间和CPU时间累计到该阶段
+    （循环中同一阶段多次出现时累加），finish 时写出一行 JSON
+    """
+
+    def __init__(self, task, destination, **info):
+        self.task = task
+        self.destination = destination
+        self.info = info
+        self.stages = {}
+        self._start_wall = self._last_wall = time.perf_counter()
+        self._start_cpu = self._last_cpu = time.process_time()
+
+    def lap(self, stage):
+        wall, cpu = time.perf_counter(), time.process_time()
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0.0, 0.0, 0]
+        entry[0] += wall - self._last_wall
+        entry[1] += cpu - self._last_cpu
+        entry[2] += 1
+        self._last_wall, self._last_cpu = wall, cpu
+
+    def finish(self, points=None, output=None, **info):
+        """
+        汇总并写出一条记录
+        points: 写出的点数；output: 输出文件路径（用于统计写出的字节数）
+        峰值内存为当前进程的 ru_maxrss（批量模式下是所在工作进程到目前为止的峰值），没有 resource 模块时为 None
+        """
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.process_time() - self._start_cpu
+        bytes_written = os.path.getsize(output) if output and os.path.exists(output) else None
+        peak = peak_rss_mb()
+
+        record = {'task': self.task, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid()}
+        record.update(self.info)
+        record.update(info)
+        record.update({
+            'output': output,
+            'points': points,
+            'bytes_written': bytes_written,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'points_per_s': round(points / wall, 1) if points and wall > 0 else None,
+            'mb_per_s': round(bytes_written / 1024 ** 2 / wall, 3) if bytes_written and wall > 0 else None,
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+            'stages': {name: {'wall_s': round(w, 6), 'cpu_s': round(c, 6), 'calls': n}
+                       for name, (w, c, n) in self.stages.items()},
+        })
+
+        # 每条记录一次写入（追加模式），多个进程同时写同一文件时行不会交错
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        if self.destination == '-':
+            sys.stderr.write(line)
+        else:
+            with open(self.destination, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+def start_profile(task, **info):
+    """根据环境变量 SKYBOX_PROFILE 返回 StageProfile，未设置时返回空实现（几乎没有开销）"""
+    destination = os.environ.get(PROFILE_ENV)
+    if not destination:
+        return NULL_PROFILE
+    return StageProfile(task, destination, **info)
+
+def enable_profiling(destination):
+    """开启分阶段计时（写入环境变量，批量模式的工作进程会继承）"""
+    if destination:
+        os.environ[PROFILE_ENV] = destination
@@ -0,0 +1,266 @@
+import numpy as np
+import os
+import json
+import shutil
+import time
+import zlib
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_runner import expand_inputs
+from geometry_cache import DEFAULT_CACHE_MAX_BYTES
+from hdr_io import F_DC_SCALE, TONEMAP_OPERATORS
+from image_source import DEFAULT_BAND_ROWS, open_pixels
+from adaptive_sky import build_adaptive_layout
+from pano_to_skybox import generate_sky_sphere, sky_chunk, sky_context
+from ply_reader import element_layout, open_ply_vertices, read_ply_header
+from ply_writer import DEFAULT_CHUNK_SIZE, field_block, iter_chunks
+from profiling import enable_profiling, start_profile
+
+# 序列目录中的文件名
+MANIFEST_NAME = 'sequence.json'
+GEOMETRY_NAME = 'geometry.ply'
+COLORS_NAME = 'colors.bin'
+
+# 目录输入时识别的帧图像扩展名
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.hdr', '.exr', '.npy')
+
+# 默认关键帧间隔：每隔这么多帧存一次完整颜色，其余帧只存与上一帧的差值
+DEFAULT_KEYFRAME_INTERVAL = 30
+
+def find_frames(inputs):
+    """展开帧输入：目录取其中的图像文件（按文件名排序，适用于 ffmpeg 导出的 %05d 编号），其余同 expand_inputs"""
+    frames = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(name for name in os.listdir(item) if os.path.splitext(name)[1].lower() in FRAME_EXTENSIONS)
+            frames.extend(os.path.join(item, name) for name in names)
+        else:
+            frames.extend(expand_inputs([item]))
+    return frames
+
+def quantize_f_dc(colors):
+    """
+    把 f_dc 量化为 uint8
+    8位输入最近像素采样时 f_dc = rgb / 255 * 1.7，量化无损；预过滤的平均颜色和HDR色调映射结果误差不超过半级
+    """
+    return np.clip(np.rint(colors / F_DC_SCALE * 255.0), 0, 255).astype(np.uint8)
+
+def dequantize_f_dc(quantized):
+    return quantized.astype(np.float64) / 255.0 * F_DC_SCALE
+
+# 帧采样工作进程的状态，由 _init_frame_worker 设置
+_WORKER = {}
+
+def _init_frame_worker(job):
+    _WORKER.update(job)
+
+def _frame_colors(frame_path):
+    """工作进程：按共享几何对一帧采样，返回 (点数, 3) 的 uint8 量化颜色"""
+    profile = start_profile('sequence_frame', input=frame_path)
+    job = _WORKER
+    pixels = open_pixels(frame_path, job['raw_cache_dir'])
+    profile.lap('open')
+    # 自适应布局固定取自第一帧，其他帧只重新采样颜色
+    context = sky_context(pixels, job['num_points'], job['radius'], cache_dir=job['cache_dir'],
+                          cache_max_bytes=job['cache_max_bytes'], chunk_size=job['chunk_size'],
+                          band_rows=job['band_rows'], exposure=job['exposure'], tonemap=job['tonemap'],
+                          prefilter=job['prefilter'], layout=job['layout'])
+    profile.lap('setup')
+
+    quantized = np.empty((job['num_points'], 3), dtype=np.uint8)
+    for start, stop in iter_chunks(job['num_points'], job['chunk_size']):
+        _, colors, _ = sky_chunk(context, start, stop, profile)
+        quantized[start:stop] = quantize_f_dc(colors)
+        profile.lap('quantize')
+    profile.finish(points=job['num_points'])
+    return quantized
+
+def generate_sky_sequence(frame_files, output_dir, num_points, radius, workers=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+                          delta=True, compression_level=6, seed=0, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                          chunk_size=DEFAULT_CHUNK_SIZE, raw_cache_dir=None, band_rows=DEFAULT_BAND_ROWS, exposure=0.0,
+                          tonemap='aces', prefilter=False, adaptive=False, min_density=0.1, detail_resolution=256,
+                          compact=False, normals=True):
+    """
+    把全景视频帧序列转换为动态天空球：共享的几何只写一次，每帧只保存颜色
+
+    输出目录内容:
+    - geometry.ply: 第一帧的完整天空球（位置、scale、rot 等所有帧共用，可以直接查看）
+    - colors.bin: 每帧一段 zlib 压缩的 uint8 颜色（点数 x 3，f_dc = q / 255 * 1.7），
+      delta=True 时非关键帧保存与上一帧的差值（按 uint8 回绕相减），静止区域全为0，压缩率很高
+    - sequence.json: 清单，记录每帧在 colors.bin 中的偏移、长度以及是否为关键帧
+
+    各帧的采样由 workers 个进程并行完成，差分和压缩按帧顺序在主进程中进行
+    keyframe_interval: 关键帧间隔，解码任意一帧最多需要回溯这么多帧
+    seed: f_rest 噪声和自适应布局的随机种子（见 generate_sky_sphere）
+    其余参数同 generate_sky_sphere；几何不支持压缩格式（压缩格式会重新排列点的顺序）
+    返回清单字典
+    """
+    if not frame_files:
+        raise ValueError("没有输入帧")
+    workers = workers or os.cpu_count() or 1
+    keyframe_interval = max(1, keyframe_interval)
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.perf_counter()
+
+    # 共享几何：用第一帧生成完整天空球；第一帧只解码一次，自适应布局和几何共用
+    geometry_path = os.path.join(output_dir, GEOMETRY_NAME)
+    first = open_pixels(frame_files[0], raw_cache_dir)
+    layout = build_adaptive_layout(first, num_points, min_density, detail_resolution, seed) if adaptive else None
+    generate_sky_sphere(frame_files[0], geometry_path, num_points, radius, cache_dir=cache_dir,
+                        cache_max_bytes=cache_max_bytes, chunk_size=chunk_size, raw_cache_dir=raw_cache_dir,
+                        band_rows=band_rows, exposure=exposure, tonemap=tonemap, prefilter=prefilter,
+                        adaptive=adaptive, min_density=min_density, detail_resolution=detail_resolution,
+                        compact=compact, normals=normals, pixels=first, seed=seed, layout=layout)
+    del first
+    # 第一帧的颜色就是几何中的 f_dc，不再交给工作进程重新解码采样
+    first_colors = quantize_f_dc(field_block(open_ply_vertices(geometry_path), 'f_dc_0', 'f_dc_2'))
+
+    job = {
+        'num_points': num_points, 'radius': radius, 'cache_dir': cache_dir, 'cache_max_bytes': cache_max_bytes,
+        'chunk_size': chunk_size, 'raw_cache_dir': raw_cache_dir, 'band_rows': band_rows, 'exposure': exposure,
+        'tonemap': tonemap, 'prefilter': prefilter, 'layout': layout,
+    }
+    frames = []
+    raw_bytes = num_points * 3
+    colors_path = os.path.join(output_dir, COLORS_NAME)
+    print(f"使用 {workers} 个进程处理 {len(frame_files)} 帧...")
+
+    with open(colors_path, 'wb') as stream, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_frame_worker, initargs=(job,)) as pool:
+        # 按顺序取回结果，同时提交的帧数有上限，驻留的颜色数组不超过 2 * workers 帧
+        pending = deque([(frame_files[0], None)])
+        queue = iter(frame_files[1:])
+        previous = None
+        for frame_path in queue:
+            pending.append((frame_path, pool.submit(_frame_colors, frame_path)))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            frame_path, future = pending.popleft()
+            for next_path in queue:
+                pending.append((next_path, pool.submit(_frame_colors, next_path)))
+                break
+            quantized = first_colors if future is None else future.result()
+
+            index = len(frames)
+            keyframe = not delta or previous is None or index % keyframe_interval == 0
+            payload = quantized if keyframe else quantized - previous
+            data = zlib.compress(payload.tobytes(), compression_level)
+            frames.append({'source': frame_path, 'offset': stream.tell(), 'size': len(data), 'keyframe': keyframe})
+            stream.write(data)
+            previous = quantized
+            print(f"[{index + 1}/{len(frame_files)}] {frame_path}: {len(data) / 1024:.1f} KB"
+                  f"（{'关键帧' if keyframe else '差分'}，{len(data) / raw_bytes:.1%}）")
+
+    manifest = {
+        'version': 1,
+        'geometry': GEOMETRY_NAME,
+        'colors': COLORS_NAME,
+        'num_points': num_points,
+        'radius': radius,
+        'seed': seed,
+        'color_encoding': {
+            'dtype': 'uint8',
+            'shape': [num_points, 3],
+            'f_dc': f'q / 255 * {F_DC_SCALE}',
+            'delta': delta,
+            'compression': 'zlib',
+        },
+        'keyframe_interval': keyframe_interval,
+        'frames': frames,
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    elapsed = time.perf_counter() - start_time
+    color_bytes = sum(frame['size'] for frame in frames)
+    geometry_bytes = os.path.getsize(geometry_path)
+    print(f"序列已生成: {output_dir}（{len(frames)} 帧，用时 {elapsed:.2f}s，{len(frames) / elapsed:.2f} 帧/s）")
+    print(f"几何 {geometry_bytes / 1e6:.1f} MB，颜色共 {color_bytes / 1e6:.2f} MB"
+          f"（平均每帧 {color_bytes / len(frames) / 1e3:.1f} KB，完整PLY为 {geometry_bytes / 1e3:.0f} KB）")
+    return manifest
+
+def read_manifest(manifest_path):
+    """读取序列清单（可以给出清单文件或序列目录）"""
+    if os.path.isdir(manifest_path):
+        manifest_path = os.path.join(manifest_path, MANIFEST_NAME)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['directory'] = os.path.dirname(os.path.abspath(manifest_path))
+    return manifest
+
+def frame_colors(manifest, index):
+    """解码第 index 帧的 uint8 颜色（从之前最近的关键帧开始逐帧累加差值）"""
+    frames = manifest['frames']
+    first = index
+    while not frames[first]['keyframe']:
+        first -= 1
+    shape = manifest['color_encoding']['shape']
+    colors = None
+    with open(os.path.join(manifest['directory'], manifest['colors']), 'rb') as stream:
+        for frame in frames[first:index + 1]:
+            stream.seek(frame['offset'])
+            payload = np.frombuffer(zlib.decompress(stream.read(frame['size'])), dtype=np.uint8).reshape(shape)
+            colors = payload.copy() if frame['keyframe'] else colors + payload
+    return colors
+
+def extract_frame(manifest_path, index, output_path):
+    """把第 index 帧还原为独立的标准PLY：复制共享几何后通过内存映射改写 f_dc"""
+    manifest = read_manifest(manifest_path)
+    colors = frame_colors(manifest, index)
+    geometry_path = os.path.join(manifest['directory'], manifest['geometry'])
+    offset, dtype, count = element_layout(read_ply_header(geometry_path), ('vertex',))['vertex']
+
+    shutil.copyfile(geometry_path, output_path)
+    vertices = np.memmap(output_path, dtype=dtype, mode='r+', offset=offset, shape=(count,))
+    field_block(vertices, 'f_dc_0', 'f_dc_2')[:] = dequantize_f_dc(colors)
+    vertices.flush()
+    del vertices
+    print(f"第 {index} 帧已导出: {output_path}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="把全景视频帧序列转换为共享几何的动态天空球（每帧只保存差分颜色）")
+    parser.add_argument("inputs", nargs="+", help="帧目录、帧图像路径或通配符；与 --extract 一起使用时为序列目录或 sequence.json")
+    parser.add_argument("-o", "--output", default="sky_sequence", help="输出目录；--extract 时为导出的PLY文件 (默认 sky_sequence)")
+    parser.add_argument("-n", "--num-points", type=int, default=100000, help="点的数量 (默认 100000)")
+    parser.add_argument("-r", "--radius", type=float, default=100.0, help="球体半径 (默认 100.0)")
+    parser.add_argument("-j", "--workers", type=int, help="并行采样的进程数，默认为CPU核数")
+    parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL, help=f"关键帧间隔 (默认 {DEFAULT_KEYFRAME_INTERVAL})")
+    parser.add_argument("--no-delta", action="store_true", help="每帧都保存完整颜色（不做差分）")
+    parser.add_argument("--seed", type=int, default=0, help="f_rest 噪声和自适应布局的随机种子 (默认 0)")
+    parser.add_argument("--cache-dir", help="几何/UV查找表缓存目录，各帧共享（推荐）")
+    parser.add_argument("--raw-cache-dir", help="原始像素缓存目录")
+    parser.add_argument("--exposure", type=float, default=0.0, help="HDR输入的曝光补偿，单位为档 (默认 0)")
+    parser.add_argument("--tonemap", choices=TONEMAP_OPERATORS, default="aces", help="HDR输入的色调映射算子 (默认 aces)")
+    parser.add_argument("--prefilter", action="store_true", help="积分图预过滤采样")
+    parser.add_argument("--adaptive", action="store_true", help="按第一帧的细节分配点密度，所有帧共用")
+    parser.add_argument("--compact", action="store_true", help="几何只写出0阶球谐属性")
+    parser.add_argument("--no-normals", action="store_true", help="几何不写出法线字段")
+    parser.add_argument("--profile", help="记录每帧各阶段耗时（JSON Lines，'-' 为标准错误）")
+    parser.add_argument("--extract", type=int, metavar="INDEX", help="把序列中的第 INDEX 帧导出为独立的PLY文件")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.extract is not None:
+        extract_frame(args.inputs[0], args.extract, args.output)
+        return 0
+
+    enable_profiling(args.profile)
+    frame_files = find_frames(args.inputs)
+    if not frame_files:
+        print("没有找到帧图像。")
+        return 1
+    generate_sky_sequence(frame_files, args.output, args.num_points, args.radius, args.workers,
+                          args.keyframe_interval, not args.no_delta, seed=args.seed, cache_dir=args.cache_dir,
+                          raw_cache_dir=args.raw_cache_dir, exposure=args.exposure, tonemap=args.tonemap,
+                          prefilter=args.prefilter, adaptive=args.adaptive, compact=args.compact,
+                          normals=not args.no_normals)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,218 @@
 import numpy as np
-from plyfile import PlyData
+from numpy.lib import recfunctions
+from numpy.lib.format import open_memmap
 import os
+import json
+import time
+import argparse
+import sys
 
-def analyze_ply(ply_path):
-    """分析 PLY 文件并提取关键信息，保存到文本文件"""
+from hdr_io import F_DC_SCALE
+from ply_reader import open_ply_vertices, read_ply_header
+from ply_writer import DEFAULT_CHUNK_SIZE, iter_chunks
+
+# XYZ 导出格式：npy（带形状和类型的 .npy）或 bin（裸 float32 小端，每点12字节）
+XYZ_FORMATS = ('npy', 'bin')
+
+# 直方图默认的分箱数
+DEFAULT_HISTOGRAM_BINS = 32
+
+# 位置哈希用的乘数（64位），用于统计重复点
+_HASH_MULTIPLIERS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+
+def _position_hash(xyz):
+    """把 float32 坐标的位模式混合成64位哈希（完全相同的坐标哈希相同）"""
+    bits = np.ascontiguousarray(xyz, dtype='<f4').view('<u4').astype(np.uint64)
+    h = bits[:, 0] * _HASH_MULTIPLIERS[0]
+    h ^= bits[:, 1] * _HASH_MULTIPLIERS[1]
+    h ^= bits[:, 2] * _HASH_MULTIPLIERS[2]
+    h ^= h >> np.uint64(31)
+    return h
+
+class _RunningStats:
+    """逐块累计每一列的个数、均值、二阶中心矩（Chan 合并公式）、最值以及 NaN/Inf 个数"""
+
+    def __init__(self, columns):
+        self.count = np.zeros(columns, dtype=np.int64)
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)
+        self.min = np.full(columns, np.inf)
+        self.max = np.full(columns, -np.inf)
+        self.nan = np.zeros(columns, dtype=np.int64)
+        self.inf = np.zeros(columns, dtype=np.int64)
+
+    def update(self, values):
+        finite = np.isfinite(values)
+        self.nan += np.isnan(values).sum(axis=0)
+        self.inf += np.isinf(values).sum(axis=0)
+
+        count = finite.sum(axis=0)
+        clean = np.where(finite, values, 0.0)
+        mean = clean.sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(finite, values - mean, 0.0) ** 2).sum(axis=0)
+        self.min = np.minimum(self.min, np.where(finite, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(finite, values, -np.inf).max(axis=0))
+
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.where(total > 0, count / np.maximum(total, 1), 0.0)
+        self.mean += delta * weight
+        self.m2 += m2 + delta * delta * self.count * weight
+        self.count = total
+
+    def summary(self, k):
+        """第 k 列的统计结果（没有有效值时均值等为 None）"""
+        valid = self.count[k] > 0
+        return {
+            'min': float(self.min[k]) if valid else None,
+            'max': float(self.max[k]) if valid else None,
+            'mean': float(self.mean[k]) if valid else None,
+            'std': float(np.sqrt(self.m2[k] / self.count[k])) if valid else None,
+            'nan': int(self.nan[k]),
+            'inf': int(self.inf[k]),
+        }
+
+def _histogram(counts, edges):
+    return {'edges': [float(e) for e in edges], 'counts': [int(c) for c in counts]}
+
+def analyze_ply(ply_path, report_path=None, xyz_format=None, xyz_path=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                histogram_bins=DEFAULT_HISTOGRAM_BINS, duplicates=True):
+    """
+    以内存映射方式分块遍历PLY顶点，生成统计报告（JSON）
+    - 各属性的 min/max/mean/std 及 NaN/Inf 个数，位置包围盒
+    - 到原点距离的分布（第二遍只读取坐标，按第一遍得到的范围分箱）
+    - 颜色直方图：f_dc 按本项目的换算（f_dc / 1.7）还原为 0-255 显示值
+    - 完全相同位置的重复点个数（基于64位位置哈希，每点占用8字节内存）
+    xyz_format: 可选导出坐标，'npy' 或 'bin'，按块批量写出
+    返回报告字典
+    """
+    start_time = time.perf_counter()
     print(f"正在分析 {ply_path}...")
-    plydata = PlyData.read(ply_path)
-    
-    # 获取点的总数
-    vertex_count = len(plydata['vertex'])
-    
-    # 获取数据规范 (字段和格式)
-    vertex_properties = [prop.name for prop in plydata['vertex'].properties]
-    vertex_formats = [prop.val_dtype for prop in plydata['vertex'].properties]
-    
-    # 提取 XYZ 坐标
-    x = plydata['vertex']['x']
-    y = plydata['vertex']['y']
-    z = plydata['vertex']['z']
-    
-    xyz = np.column_stack((x, y, z))
-    
-    # 创建结果文本文件
+    header = read_ply_header(ply_path)
+    vertices = open_ply_vertices(ply_path)
+    vertex_count = len(vertices)
+    names = vertices.dtype.names
+    has_xyz = all(name in names for name in ('x', 'y', 'z'))
+    color_names = [name for name in ('f_dc_0', 'f_dc_1', 'f_dc_2') if name in names]
+
     base_name = os.path.splitext(ply_path)[0]
-    info_file = f"{base_name}_info.txt"
-    xyz_file = f"{base_name}_xyz.txt"
-    
-    # 保存基本信息
-    with open(info_file, 'w') as f:
-        f.write(f"PLY 文件: {ply_path}\n")
-        f.write(f"点数量: {vertex_count}\n")
-        f.write(f"字段列表: {', '.join(vertex_properties)}\n")
-        f.write(f"字段格式: {', '.join(str(fmt) for fmt in vertex_formats)}\n")
-    
-    # 保存 XYZ 坐标
-    with open(xyz_file, 'w') as f:
-        f.write("# 点云中每个点的 X Y Z 坐标\n")
-        f.write("# 格式: X Y Z\n")
-        for i in range(xyz.shape[0]):
-            f.write(f"{xyz[i, 0]} {xyz[i, 1]} {xyz[i, 2]}\n")
-    
-    print(f"基本信息已保存到 {info_file}")
-    print(f"XYZ 坐标已保存到 {xyz_file}")
+    report_path = report_path or f"{base_name}_report.json"
+    if xyz_format is not None and not has_xyz:
+        raise ValueError(f"{ply_path} 中没有 x/y/z 字段，无法导出坐标")
+    if xyz_format is not None:
+        xyz_path = xyz_path or f"{base_name}_xyz.{xyz_format}"
+        if xyz_format == 'npy':
+            xyz_out = open_memmap(xyz_path, mode='w+', dtype='<f4', shape=(vertex_count, 3))
+        elif xyz_format == 'bin':
+            xyz_out = open(xyz_path, 'wb')
+        else:
+            raise ValueError(f"未知的坐标导出格式: {xyz_format}，可选 {', '.join(XYZ_FORMATS)}")
+
+    # 第一遍：各属性统计、颜色直方图、位置哈希、坐标导出
+    stats = _RunningStats(len(names))
+    radius_stats = _RunningStats(1)
+    color_edges = np.linspace(0, 256, histogram_bins + 1)
+    color_counts = np.zeros((len(color_names), histogram_bins), dtype=np.int64)
+    hashes = np.empty(vertex_count if duplicates and has_xyz else 0, dtype=np.uint64)
+    bad_vertices = 0
+
+    for start, stop in iter_chunks(vertex_count, chunk_size):
+        chunk = np.asarray(vertices[start:stop])
+        values = recfunctions.structured_to_unstructured(chunk, dtype=np.float64)
+        stats.update(values)
+        bad_vertices += int((~np.isfinite(values)).any(axis=1).sum())
+
+        for k, name in enumerate(color_names):
+            display = np.clip(chunk[name].astype(np.float64) / F_DC_SCALE, 0.0, 1.0) * 255.0
+            color_counts[k] += np.histogram(display[np.isfinite(display)], bins=color_edges)[0]
+
+        if has_xyz:
+            xyz = np.column_stack((chunk['x'], chunk['y'], chunk['z']))
+            radius_stats.update(np.sqrt((xyz.astype(np.float64) ** 2).sum(axis=1))[:, None])
+            if len(hashes):
+                hashes[start:stop] = _position_hash(xyz)
+            if xyz_format == 'npy':
+                xyz_out[start:stop] = xyz
+            elif xyz_format == 'bin':
+                xyz.astype('<f4').tofile(xyz_out)
+
+    if xyz_format == 'npy':
+        xyz_out.flush()
+        del xyz_out
+    elif xyz_format == 'bin':
+        xyz_out.close()
+
+    report = {
+        'file': ply_path,
+        'format': header['format'],
+        'vertex_count': vertex_count,
+        'bytes_per_vertex': vertices.dtype.itemsize,
+        'properties': [{'name': name, 'type': str(vertices.dtype.fields[name][0])} for name in names],
+        'fields': {name: stats.summary(k) for k, name in enumerate(names)},
+        'vertices_with_nan_or_inf': bad_vertices,
+    }
+
+    if has_xyz:
+        xyz_index = [names.index(axis) for axis in ('x', 'y', 'z')]
+        report['bounds'] = {
+            'min': [report['fields'][names[k]]['min'] for k in xyz_index],
+            'max': [report['fields'][names[k]]['max'] for k in xyz_index],
+        }
+
+        # 第二遍：按距离范围分箱
+        radius = radius_stats.summary(0)
+        if radius_stats.count[0] > 0:
+            radius_edges = np.linspace(radius['min'], radius['max'], histogram_bins + 1)
+            if radius['max'] == radius['min']:
+                radius_edges = np.linspace(radius['min'] - 0.5, radius['max'] + 0.5, histogram_bins + 1)
+            radius_counts = np.zeros(histogram_bins, dtype=np.int64)
+            for start, stop in iter_chunks(vertex_count, chunk_size):
+                chunk = vertices[start:stop]
+                r = np.sqrt(chunk['x'].astype(np.float64) ** 2 + chunk['y'].astype(np.float64) ** 2
+                            + chunk['z'].astype(np.float64) ** 2)
+                radius_counts += np.histogram(r[np.isfinite(r)], bins=radius_edges)[0]
+            radius['histogram'] = _histogram(radius_counts, radius_edges)
+        report['radius'] = radius
+
+        if duplicates:
+            report['duplicate_positions'] = int(vertex_count - len(np.unique(hashes)))
+
+    if color_names:
+        report['color_histogram'] = {
+            'mapping': f'clip(f_dc / {F_DC_SCALE}, 0, 1) * 255',
+            'edges': [float(e) for e in color_edges],
+            'counts': {name: [int(c) for c in counts] for name, counts in zip(color_names, color_counts)},
+        }
+    if xyz_format is not None:
+        report['xyz_export'] = {'path': xyz_path, 'format': xyz_format, 'dtype': 'float32', 'shape': [vertex_count, 3]}
+    report['elapsed_seconds'] = round(time.perf_counter() - start_time, 3)
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+    print(f"统计报告已保存到 {report_path}")
+    if xyz_format is not None:
+        print(f"XYZ 坐标已保存到 {xyz_path}")
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="分块统计PLY点云并生成JSON报告")
+    parser.add_argument("ply", nargs="?", default="skybox.ply", help="PLY文件路径 (默认 skybox.ply)")
+    parser.add_argument("-o", "--report", help="报告路径，默认为 <文件名>_report.json")
+    parser.add_argument("--xyz", choices=XYZ_FORMATS, help="同时导出坐标：npy 或 bin（裸 float32）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"每块的顶点数 (默认 {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--bins", type=int, default=DEFAULT_HISTOGRAM_BINS, help=f"直方图分箱数 (默认 {DEFAULT_HISTOGRAM_BINS})")
+    parser.add_argument("--no-duplicates", action="store_true", help="不统计重复点（省去每点8字节的哈希内存）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.ply):
+        print(f"错误: 找不到 {args.ply}")
+        return 1
+    analyze_ply(args.ply, args.report, args.xyz, chunk_size=args.chunk_size,
+                histogram_bins=args.bins, duplicates=not args.no_duplicates)
+    return 0
 
 if __name__ == "__main__":
-    # 查找当前目录下的 skybox.ply 文件
-    ply_path = "skybox.ply"
-    if not os.path.exists(ply_path):
-        print(f"错误: 在当前目录下找不到 {ply_path}")
-    else:
-        analyze_ply(ply_path)
+    sys.exit(main())
@@ -1,63 +1,42 @@
+from ply_reader import element_layout, read_ply_header
+
 def extract_ply_header(ply_file_path):
     """
-    读取PLY文件并提取头部信息，尝试多种编码
+    读取PLY文件并提取头部信息
+    以二进制方式只打开一次文件，按 latin1 解码（任何字节都能解码，不需要逐个尝试编码）
     
     参数:
         ply_file_path: PLY文件路径
         
     返回:
-        头部信息的字符串
+        头部信息的字符串，读取失败时返回 None
     """
-    encodings = ['utf-8', 'latin1', 'ascii']
-    
-    for encoding in encodings:
-        try:
-            header_lines = []
-            with open(ply_file_path, 'r', encoding=encoding) as file:
-                line = file.readline()
-                header_lines.append(line.strip())
-                
-                # 继续读取直到找到end_header行
-                while line and "end_header" not in line:
-                    line = file.readline()
-                    header_lines.append(line.strip())
-            
-            print(f"成功使用 {encoding} 编码读取文件")
-            return "\n".join(header_lines)
-        
-        except Exception as e:
-            print(f"使用 {encoding} 编码读取文件时出错: {e}")
-    
-    # 如果所有编码都失败了，尝试二进制模式
     try:
-        with open(ply_file_path, 'rb') as file:
-            header_bytes = b''
-            line = file.readline()
-            header_bytes += line
-            
-            # 继续读取直到找到end_header行
-            while line and b"end_header" not in line:
-                line = file.readline()
-                header_bytes += line
-            
-            # 尝试多种解码方式
-            for encoding in encodings:
-                try:
-                    header_text = header_bytes.decode(encoding)
-                    print(f"成功使用二进制模式和 {encoding} 解码")
-                    return header_text
-                except:
-                    continue
-            
-            # 如果解码都失败，返回前100个字节的十六进制表示
-            print("无法解码二进制数据，返回十六进制表示")
-            hex_representation = ' '.join(f'{b:02x}' for b in header_bytes[:100])
-            return f"Binary PLY header (first 100 bytes in hex):\n{hex_representation}"
-    
-    except Exception as e:
-        print(f"以二进制模式读取文件时出错: {e}")
+        return read_ply_header(ply_file_path)['text']
+    except (OSError, ValueError) as e:
+        print(f"读取PLY头部时出错: {e}")
         return None
 
+def describe_ply(ply_file_path):
+    """根据头部列出各元素的记录数、每条记录的字节数和数据区偏移（二进制PLY）"""
+    header = read_ply_header(ply_file_path)
+    lines = [f"格式: {header['format']}，头部 {header['header_size']} 字节"]
+    if header['format'] == 'ascii':
+        for name, count, properties in header['elements']:
+            lines.append(f"元素 {name}: {count} 条记录，{len(properties)} 个属性")
+        return "\n".join(lines)
+    # 第一个含 list 属性的元素及其之后的元素记录长度可变，只列出属性个数
+    fixed = []
+    for name, _, properties in header['elements']:
+        if any(ply_type == 'list' for _, ply_type in properties):
+            break
+        fixed.append(name)
+    for name, (offset, dtype, count) in element_layout(header, fixed).items():
+        lines.append(f"元素 {name}: {count} 条记录，{len(dtype.names)} 个属性，每条 {dtype.itemsize} 字节，数据区偏移 {offset}")
+    for name, count, properties in header['elements'][len(fixed):]:
+        lines.append(f"元素 {name}: {count} 条记录，{len(properties)} 个属性（含 list，记录长度可变）")
+    return "\n".join(lines)
+
 # 使用方法
 if __name__ == "__main__":
     # 替换为你的skybox.ply文件路径
@@ -72,5 +51,6 @@ if __name__ == "__main__":
         with open("ply_header.txt", "w", encoding="utf-8") as f:
             f.write(header)
         print("\n头部结构已保存到 ply_header.txt")
+        print("\n" + describe_ply(ply_file_path))
     else:
         print("无法提取PLY文件头部结构")
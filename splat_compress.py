@@ -0,0 +1,308 @@
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from ply_reader import read_ply_elements, read_ply_header
+from ply_writer import (DEFAULT_CHUNK_SIZE, SH0_PROPERTIES, allocate_vertices, field_block, fill_gaussians,
+                        iter_chunks, ply_elements_header, write_ply)
+
+# 压缩格式（PlayCanvas/SuperSplat 的 compressed PLY）每个空间块的点数
+CHUNK_POINTS = 256
+
+# 0阶球谐系数，f_dc 与显示颜色的换算: color = 0.5 + SH_C0 * f_dc
+SH_C0 = 0.28209479177387814
+
+# 每个块记录位置、对数缩放和颜色的取值范围，块内数值按范围量化
+CHUNK_PROPERTIES = (
+    ['min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z']
+    + ['min_scale_x', 'min_scale_y', 'min_scale_z', 'max_scale_x', 'max_scale_y', 'max_scale_z']
+    + ['min_r', 'min_g', 'min_b', 'max_r', 'max_g', 'max_b']
+)
+
+# 每个点 16 字节：位置/缩放 11-10-11 位，旋转 2+10+10+10 位，颜色和不透明度各 8 位
+COMPRESSED_VERTEX_PROPERTIES = [
+    ('packed_position', 'uint'),
+    ('packed_rotation', 'uint'),
+    ('packed_scale', 'uint'),
+    ('packed_color', 'uint'),
+]
+
+# 对数缩放的截断范围，避免极端值拉大块内量化范围
+_SCALE_LIMIT = 20.0
+
+# 编码前把顶点整理成 (N, 14) float32：x y z, f_dc*3, opacity, scale*3, rot*4
+_GAUSSIAN_COLUMNS = 14
+
+def _gaussian_columns(vertices):
+    """从标准3DGS记录中取出压缩需要的字段（f_rest 和法线不参与压缩）"""
+    columns = np.empty((len(vertices), _GAUSSIAN_COLUMNS), dtype=np.float32)
+    columns[:, 0:3] = field_block(vertices, 'x', 'z')
+    columns[:, 3:6] = field_block(vertices, 'f_dc_0', 'f_dc_2')
+    columns[:, 6] = vertices['opacity']
+    columns[:, 7:10] = field_block(vertices, 'scale_0', 'scale_2')
+    columns[:, 10:14] = field_block(vertices, 'rot_0', 'rot_3')
+    return columns
+
+def _spread_bits(v):
+    """把10位整数的各位间隔两位展开，用于三维 Morton 编码"""
+    v = v.astype(np.uint32)
+    v = (v | (v << 16)) & 0x030000FF
+    v = (v | (v << 8)) & 0x0300F00F
+    v = (v | (v << 4)) & 0x030C30C3
+    v = (v | (v << 2)) & 0x09249249
+    return v
+
+def morton_order(positions):
+    """按三维 Morton 码（每轴10位，范围取这批点的包围盒）排序，返回排序下标"""
+    lo = positions.min(axis=0)
+    extent = positions.max(axis=0) - lo
+    extent[extent == 0] = 1.0
+    q = np.clip(((positions - lo) / extent * 1023).astype(np.int64), 0, 1023)
+    code = (_spread_bits(q[:, 0]) << 2) | (_spread_bits(q[:, 1]) << 1) | _spread_bits(q[:, 2])
+    return np.argsort(code, kind='stable')
+
+def _normalize(values, lo, hi):
+    """按块内范围把数值归一化到 [0, 1]，范围为0时取0"""
+    extent = hi - lo
+    return np.where(extent > 0, (values - lo) / np.where(extent > 0, extent, 1.0), 0.0)
+
+def _quantize(unit, bits):
+    top = (1 << bits) - 1
+    return np.clip(np.rint(unit * top), 0, top).astype(np.uint32)
+
+def _pack_11_10_11(unit):
+    return (_quantize(unit[..., 0], 11) << 21) | (_quantize(unit[..., 1], 10) << 11) | _quantize(unit[..., 2], 11)
+
+def _unpack_11_10_11(packed):
+    packed = packed.astype(np.uint32)
+    return np.stack((
+        (packed >> 21) / 2047.0,
+        ((packed >> 11) & 1023) / 1023.0,
+        (packed & 2047) / 2047.0,
+    ), axis=-1)
+
+def _pack_rotation(rotation):
+    """
+    四元数“最小三分量”编码：高2位记录绝对值最大的分量序号，
+    其余三个分量（范围 ±1/√2）各占10位；最大分量取正，解码时由单位长度恢复
+    """
+    rotation = rotation / np.linalg.norm(rotation, axis=-1, keepdims=True)
+    largest = np.argmax(np.abs(rotation), axis=-1)
+    sign = np.where(np.take_along_axis(rotation, largest[..., None], axis=-1) < 0, -1.0, 1.0)
+    rotation = rotation * sign
+
+    packed = largest.astype(np.uint32)
+    for i in range(4):
+        component = _quantize(rotation[..., i] * (math.sqrt(2) * 0.5) + 0.5, 10)
+        packed = np.where(largest == i, packed, (packed << 10) | component)
+    return packed
+
+def _unpack_rotation(packed):
+    packed = packed.astype(np.uint32)
+    norm = 1.0 / (math.sqrt(2) * 0.5)
+    a = (((packed >> 20) & 1023) / 1023.0 - 0.5) * norm
+    b = (((packed >> 10) & 1023) / 1023.0 - 0.5) * norm
+    c = ((packed & 1023) / 1023.0 - 0.5) * norm
+    m = np.sqrt(np.maximum(1.0 - (a * a + b * b + c * c), 0.0))
+
+    largest = packed >> 30
+    rotation = np.empty(packed.shape + (4,))
+    rotation[largest == 0] = np.column_stack((m, a, b, c))[largest == 0]
+    rotation[largest == 1] = np.column_stack((a, m, b, c))[largest == 1]
+    rotation[largest == 2] = np.column_stack((a, b, m, c))[largest == 2]
+    rotation[largest == 3] = np.column_stack((a, b, c, m))[largest == 3]
+    return rotation
+
+def encode_chunks(columns):
+    """
+    把一批点（(N, 14) 列数组，已按空间顺序排好）编码为压缩格式
+    每 CHUNK_POINTS 个点为一块，最后一块可以不满
+    返回 (块记录 (ceil(N/256), 18) float32, 打包后的点 (N, 4) uint32)
+    """
+    count = len(columns)
+    num_chunks = (count + CHUNK_POINTS - 1) // CHUNK_POINTS
+    # 不满的最后一块用最后一个点补齐，不影响块内范围
+    padded = np.concatenate((columns, np.repeat(columns[-1:], num_chunks * CHUNK_POINTS - count, axis=0)))
+    blocks = padded.reshape(num_chunks, CHUNK_POINTS, _GAUSSIAN_COLUMNS).astype(np.float64)
+
+    positions = blocks[..., 0:3]
+    colors = blocks[..., 3:6] * SH_C0 + 0.5
+    alpha = 1.0 / (1.0 + np.exp(-blocks[..., 6]))
+    scales = np.clip(blocks[..., 7:10], -_SCALE_LIMIT, _SCALE_LIMIT)
+    rotations = blocks[..., 10:14]
+
+    chunks = np.empty((num_chunks, len(CHUNK_PROPERTIES)), dtype=np.float32)
+    ranges = []
+    for k, values in enumerate((positions, scales, colors)):
+        lo, hi = values.min(axis=1), values.max(axis=1)
+        chunks[:, 6 * k:6 * k + 3] = lo
+        chunks[:, 6 * k + 3:6 * k + 6] = hi
+        # 用写入文件的 float32 范围量化，保证与解码端一致
+        ranges.append((chunks[:, None, 6 * k:6 * k + 3].astype(np.float64),
+                       chunks[:, None, 6 * k + 3:6 * k + 6].astype(np.float64)))
+
+    packed = np.empty((num_chunks, CHUNK_POINTS, 4), dtype=np.uint32)
+    packed[..., 0] = _pack_11_10_11(_normalize(positions, *ranges[0]))
+    packed[..., 1] = _pack_rotation(rotations)
+    packed[..., 2] = _pack_11_10_11(_normalize(scales, *ranges[1]))
+    color = _normalize(colors, *ranges[2])
+    packed[..., 3] = ((_quantize(color[..., 0], 8) << 24) | (_quantize(color[..., 1], 8) << 16)
+                      | (_quantize(color[..., 2], 8) << 8) | _quantize(alpha, 8))
+    return chunks, packed.reshape(-1, 4)[:count]
+
+class CompressedPlyWriter:
+    """
+    流式写入压缩格式的PLY（chunk 元素 + 每点16字节的 vertex 元素）
+    每批输入先按 Morton 码排序，使同一块内的点在空间上相邻，块内量化范围更小；
+    不足一块的尾部留到下一批，只有文件最后一块可以不满
+    块记录很小，全部保存在内存里，结束时回填到顶点数据之前
+    只保留0阶球谐（f_dc），f_rest 与法线不写出
+    """
+
+    def __init__(self, output_file, num_vertices):
+        self.num_vertices = num_vertices
+        self.num_chunks = (num_vertices + CHUNK_POINTS - 1) // CHUNK_POINTS
+        self.written = 0
+        self._chunks = np.zeros((self.num_chunks, len(CHUNK_PROPERTIES)), dtype='<f4')
+        self._pending = np.empty((0, _GAUSSIAN_COLUMNS), dtype=np.float32)
+
+        header = ply_elements_header([
+            ('chunk', self.num_chunks, CHUNK_PROPERTIES),
+            ('vertex', num_vertices, COMPRESSED_VERTEX_PROPERTIES),
+        ])
+        self._chunk_offset = len(header)
+        self._file = open(output_file, 'wb')
+        self._file.write(header)
+        self._file.seek(self._chunk_offset + self._chunks.nbytes)
+
+    def write(self, vertices):
+        """追加一批标准3DGS顶点记录（需要包含位置、f_dc、opacity、scale_* 和 rot_* 字段）"""
+        columns = _gaussian_columns(vertices)
+        if len(self._pending):
+            columns = np.concatenate((self._pending, columns))
+        full = len(columns) // CHUNK_POINTS * CHUNK_POINTS
+        if full:
+            self._encode(columns[:full])
+        self._pending = columns[full:]
+
+    def _encode(self, columns):
+        if self.written + len(columns) > self.num_vertices:
+            raise ValueError(f"写入的顶点数超过了头部声明的 {self.num_vertices} 个")
+        columns = columns[morton_order(columns[:, 0:3])]
+        chunks, packed = encode_chunks(columns)
+        first = self.written // CHUNK_POINTS
+        self._chunks[first:first + len(chunks)] = chunks
+        packed.astype('<u4').tofile(self._file)
+        self.written += len(columns)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if len(self._pending):
+                self._encode(self._pending)
+                self._pending = self._pending[:0]
+            if self.written != self.num_vertices:
+                raise ValueError(f"写入了 {self.written} 个顶点，与头部声明的 {self.num_vertices} 个不一致")
+            self._file.seek(self._chunk_offset)
+            self._chunks.tofile(self._file)
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._file.close()
+        else:
+            self.close()
+
+def is_compressed_ply(ply_path):
+    """根据头部判断是否为压缩格式（含 chunk 元素且顶点为打包字段）"""
+    header = read_ply_header(ply_path)
+    names = {name: [prop for prop, _ in properties] for name, _, properties in header['elements']}
+    return 'chunk' in names and 'packed_position' in names.get('vertex', [])
+
+def read_compressed_ply(ply_path):
+    """
+    解码压缩格式的PLY，返回字典:
+    positions (N, 3)、f_dc (N, 3)、opacity (N,)、scales (N, 3, 对数尺度)、rotations (N, 4)
+    兼容不带颜色范围（min_r 等）的旧版块记录
+    """
+    elements = read_ply_elements(ply_path, names=('chunk', 'vertex'))
+    return decode_compressed(elements['chunk'], elements['vertex'])
+
+def decode_compressed(chunk, vertex, indices=None):
+    """
+    解码压缩格式的块记录和打包顶点，返回格式同 read_compressed_ply
+    indices: 只解码这些序号的顶点（例如抽样检查），None 表示全部
+    """
+    if indices is None:
+        indices = np.arange(len(vertex))
+    else:
+        indices = np.asarray(indices, dtype=np.int64)
+        vertex = vertex[indices]
+    index = indices // CHUNK_POINTS
+
+    def chunk_range(prefix, axes):
+        lo = np.column_stack([chunk[f'min_{prefix}{axis}'] for axis in axes]).astype(np.float64)[index]
+        hi = np.column_stack([chunk[f'max_{prefix}{axis}'] for axis in axes]).astype(np.float64)[index]
+        return lo, hi - lo
+
+    lo, extent = chunk_range('', 'xyz')
+    positions = lo + _unpack_11_10_11(vertex['packed_position']) * extent
+    lo, extent = chunk_range('scale_', 'xyz')
+    scales = lo + _unpack_11_10_11(vertex['packed_scale']) * extent
+
+    packed_color = vertex['packed_color'].astype(np.uint32)
+    color = np.column_stack([((packed_color >> shift) & 0xFF) / 255.0 for shift in (24, 16, 8)])
+    if 'min_r' in chunk.dtype.names:
+        lo, extent = chunk_range('', 'rgb')
+        color = lo + color * extent
+    alpha = np.clip((packed_color & 0xFF) / 255.0, 1e-6, 1 - 1e-6)
+
+    return {
+        'positions': positions,
+        'f_dc': (color - 0.5) / SH_C0,
+        'opacity': -np.log(1.0 / alpha - 1.0),
+        'scales': scales,
+        'rotations': _unpack_rotation(vertex['packed_rotation']),
+    }
+
+def compress_ply(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """把标准3DGS PLY 按块读取（内存映射）并转换为压缩格式"""
+    vertices = read_ply_elements(input_path, names=('vertex',))['vertex']
+    with CompressedPlyWriter(output_path, len(vertices)) as writer:
+        for start, stop in iter_chunks(len(vertices), chunk_size):
+            writer.write(vertices[start:stop])
+
+def decompress_ply(input_path, output_path):
+    """把压缩格式解码为只含0阶球谐的标准3DGS PLY（不写法线）"""
+    splats = read_compressed_ply(input_path)
+    properties = [name for name in SH0_PROPERTIES if name not in ('nxx', 'ny', 'nz')]
+    vertices = allocate_vertices(len(splats['positions']), properties)
+    fill_gaussians(vertices, splats['positions'], splats['f_dc'], opacity=splats['opacity'],
+                   scales=splats['scales'], rotation=splats['rotations'])
+    write_ply(output_path, vertices, properties)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="3DGS PLY 与压缩格式（按256点分块量化）之间的转换")
+    parser.add_argument("input", help="输入PLY文件")
+    parser.add_argument("output", help="输出PLY文件")
+    parser.add_argument("-d", "--decompress", action="store_true", help="把压缩格式解码为标准PLY（只含0阶球谐）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.decompress:
+        decompress_ply(args.input, args.output)
+    else:
+        compress_ply(args.input, args.output)
+    print(f"已转换: {args.input} -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import io
+import json
+import os
+import struct
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# 已解码图块缓存的默认上限（字节）；整幅图像不超过上限时所有图块都只解码一次
+DEFAULT_TILE_CACHE_BYTES = 1 << 30
+
+# TIFF 标签编号
+_TIFF_BITS_PER_SAMPLE = 258
+_TIFF_COMPRESSION = 259
+_TIFF_PHOTOMETRIC = 262
+_TIFF_SAMPLES_PER_PIXEL = 277
+_TIFF_PLANAR_CONFIG = 284
+_TIFF_PREDICTOR = 317
+_TIFF_TILE_WIDTH = 322
+_TIFF_TILE_LENGTH = 323
+_TIFF_TILE_OFFSETS = 324
+_TIFF_TILE_BYTE_COUNTS = 325
+_TIFF_EXTRA_SAMPLES = 338
+_TIFF_JPEG_TABLES = 347
+_TIFF_YCBCR_SUBSAMPLING = 530
+_TIFF_IMAGE_WIDTH = 256
+_TIFF_IMAGE_LENGTH = 257
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_ROWS_PER_STRIP = 278
+_TIFF_STRIP_BYTE_COUNTS = 279
+
+# 由 NumPy 直接逐块解码的 TIFF 压缩方式：无压缩、Adobe Deflate、旧式 Deflate；
+# 其他压缩（LZW、JPEG 等）把单个图块包装成单条带 TIFF 交给 Pillow（libtiff）解码
+_TIFF_NO_COMPRESSION = 1
+_TIFF_DEFLATE = (8, 32946)
+_TIFF_JPEG = 7
+
+# TIFF 光度解释：RGB，以及 JPEG 压缩时常用的 YCbCr（由 libtiff 转换为 RGB）
+_TIFF_RGB = 2
+_TIFF_YCBCR = 6
+
+class TileMosaic:
+    """
+    由规则网格图块组成的大图像，形状和 dtype 与普通像素数组一致，图块按需解码
+    - gather: 把采样坐标按图块分组，每次调用中每个图块最多解码一次
+    - 行切片 mosaic[top:bottom, :, :3]: 拼出整行带（用于积分图、细节图等按行带处理的场景）
+    已解码的图块保存在 LRU 缓存中，总大小不超过 max_cache_bytes（但至少容纳一行图块）：
+    天空球等按斐波那契顺序分块采样时每块都会用到所有图块，整幅图像能放进缓存时每个图块只解码一次
+    """
+
+    def __init__(self, load_tile, row_edges, col_edges, max_cache_bytes=DEFAULT_TILE_CACHE_BYTES):
+        """
+        load_tile(tile_row, tile_col): 返回该图块的 (h, w, C) 像素数组，颜色取前三个通道
+        row_edges, col_edges: 图块在整幅图像中的行/列边界（长度为图块行/列数 + 1）
+        """
+        self._load_tile = load_tile
+        self.row_edges = np.asarray(row_edges, dtype=np.int64)
+        self.col_edges = np.asarray(col_edges, dtype=np.int64)
+        self.grid_shape = (len(self.row_edges) - 1, len(self.col_edges) - 1)
+        self.max_cache_bytes = max_cache_bytes
+        self.max_cached_tiles = 1
+        self.decoded_tiles = 0
+        self._cache = OrderedDict()
+        self.dtype = self.tile(0, 0).dtype
+        self.shape = (int(self.row_edges[-1]), int(self.col_edges[-1]), 3)
+        self.ndim = 3
+        # 行带切片会依次用到一整行图块，缓存至少要能容纳一行，避免逐带重复解码
+        tile_bytes = int(np.diff(self.row_edges).max() * np.diff(self.col_edges).max()) * 3 * self.dtype.itemsize
+        self.max_cached_tiles = max(1, self.grid_shape[1], max_cache_bytes // tile_bytes)
+
+    def tile(self, tile_row, tile_col):
+        """取出一个图块（只取RGB三个通道），优先使用缓存"""
+        key = (tile_row, tile_col)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        pixels = self._load_tile(tile_row, tile_col)[..., :3]
+        expected = (self.row_edges[tile_row + 1] - self.row_edges[tile_row],
+                    self.col_edges[tile_col + 1] - self.col_edges[tile_col])
+        if pixels.shape[:2] != expected:
+            raise ValueError(f"图块 ({tile_row}, {tile_col}) 的尺寸 {pixels.shape[:2]} 与网格 {expected} 不一致")
+        self.decoded_tiles += 1
+
+        self._cache[key] = pixels
+        while len(self._cache) > self.max_cached_tiles:
+            self._cache.popitem(last=False)
+        return pixels
+
+    def gather(self, rows, cols):
+        """按像素坐标批量取出RGB值，返回 (N, 3) 数组；先按图块分组，每个图块只解码一次"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        out = np.empty((len(rows), 3), dtype=self.dtype)
+        if len(rows) == 0:
+            return out
+
+        tile_rows = np.searchsorted(self.row_edges, rows, side='right') - 1
+        tile_cols = np.searchsorted(self.col_edges, cols, side='right') - 1
+        tile_ids = tile_rows * self.grid_shape[1] + tile_cols
+        order = np.argsort(tile_ids, kind='stable')
+        sorted_ids = tile_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+
+        # 已在缓存中的图块先处理，避免在本次调用中被淘汰后又重新解码
+        groups = [(divmod(int(sorted_ids[lo]), self.grid_shape[1]), lo, hi) for lo, hi in zip(starts, stops)]
+        groups.sort(key=lambda group: group[0] not in self._cache)
+        for (tile_row, tile_col), lo, hi in groups:
+            pixels = self.tile(tile_row, tile_col)
+            selected = order[lo:hi]
+            out[selected] = pixels[rows[selected] - self.row_edges[tile_row], cols[selected] - self.col_edges[tile_col]]
+        return out
+
+    def __getitem__(self, key):
+        """支持 mosaic[top:bottom, left:right, channels] 形式的切片（步长为1），按需拼接图块"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        row_key, col_key, channel_key = key + (slice(None),) * (3 - len(key))
+        if not isinstance(row_key, slice) or not isinstance(col_key, slice):
+            raise IndexError("图块拼接只支持行列切片")
+        top, bottom, row_step = row_key.indices(self.shape[0])
+        left, right, col_step = col_key.indices(self.shape[1])
+        if row_step != 1 or col_step != 1:
+            raise IndexError("图块拼接只支持步长为1的切片")
+        bottom, right = max(top, bottom), max(left, right)
+
+        out = np.empty((bottom - top, right - left, 3), dtype=self.dtype)
+        first_row = np.searchsorted(self.row_edges, top, side='right') - 1
+        first_col = np.searchsorted(self.col_edges, left, side='right') - 1
+        for tile_row in range(first_row, self.grid_shape[0]):
+            row0, row1 = self.row_edges[tile_row], self.row_edges[tile_row + 1]
+            if row0 >= bottom:
+                break
+            for tile_col in range(first_col, self.grid_shape[1]):
+                col0, col1 = self.col_edges[tile_col], self.col_edges[tile_col + 1]
+                if col0 >= right:
+                    break
+                r0, r1 = max(top, row0), min(bottom, row1)
+                c0, c1 = max(left, col0), min(right, col1)
+                out[r0 - top:r1 - top, c0 - left:c1 - left] = self.tile(tile_row, tile_col)[r0 - row0:r1 - row0, c0 - col0:c1 - col0]
+        return out[..., channel_key]
+
+def _grid_edges(sizes, path, axis):
+    """由各行（列）的尺寸计算边界，要求同一行（列）的图块尺寸一致"""
+    first = [line[0] for line in sizes]
+    for k, line in enumerate(sizes):
+        if any(size != line[0] for size in line):
+            raise ValueError(f"{path} 中第 {k} {axis}的图块尺寸不一致")
+    return np.concatenate(([0], np.cumsum(first)))
+
+def open_tile_grid(manifest_path, load_pixels, max_cache_bytes=DEFAULT_TILE_CACHE_BYTES):
+    """
+    打开图块网格清单（JSON），格式为 {"tiles": [["r0c0.png", "r0c1.png"], ["r1c0.png", "r1c1.png"]]}
+    路径相对于清单所在目录；load_pixels(path) 负责解码单个图块文件
+    只读取各图块的头部确定尺寸，像素在采样时才解码
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    paths = [[os.path.join(base, name) for name in row] for row in manifest['tiles']]
+    if not paths or not paths[0] or any(len(row) != len(paths[0]) for row in paths):
+        raise ValueError(f"{manifest_path} 中的图块网格必须是非空的矩形")
+
+    sizes = [[Image.open(path).size for path in row] for row in paths]
+    row_edges = _grid_edges([[h for _, h in row] for row in sizes], manifest_path, '行')
+    col_edges = _grid_edges([[row[c][0] for row in sizes] for c in range(len(paths[0]))], manifest_path, '列')
+    return TileMosaic(lambda r, c: load_pixels(paths[r][c]), row_edges, col_edges, max_cache_bytes)
+
+def _single_strip_tiff(fields, data):
+    """
+    把一个压缩图块包装成只有一条带的小端 TIFF，返回字节串
+    fields: [(标签, 类型, 值)]，类型 3 为 SHORT、4 为 LONG（值为整数列表），7 为 UNDEFINED（值为字节串）
+    """
+    fields = sorted(fields + [(_TIFF_STRIP_OFFSETS, 4, [0]), (_TIFF_STRIP_BYTE_COUNTS, 4, [len(data)])])
+    values_offset = 8 + 2 + 12 * len(fields) + 4
+    entries, values = [], b''
+    for tag, kind, value in fields:
+        raw = bytes(value) if kind == 7 else struct.pack(f"<{len(value)}{'H' if kind == 3 else 'I'}", *value)
+        count = len(raw) if kind == 7 else len(value)
+        entries.append((tag, kind, count, raw))
+        if len(raw) > 4:
+            values += raw + b'\0' * (len(raw) % 2)
+    data_offset = values_offset + len(values)
+
+    ifd, values = struct.pack('<H', len(entries)), b''
+    for tag, kind, count, raw in entries:
+        if tag == _TIFF_STRIP_OFFSETS:
+            raw = struct.pack('<I', data_offset)
+        if len(raw) > 4:
+            ifd += struct.pack('<HHII', tag, kind, count, values_offset + len(values))
+            values += raw + b'\0' * (len(raw) % 2)
+        else:
+            ifd += struct.pack('<HHI', tag, kind, count) + raw.ljust(4, b'\0')
+    return b'II*\0' + struct.pack('<I', 8) + ifd + struct.pack('<I', 0) + values + data
+
+def open_tiled_tiff(image, max_cache_bytes=DEFAULT_TILE_CACHE_BYTES):
+    """
+    对内部分块（tiled）存储的 8 位RGB TIFF（含 GeoTIFF），按TIFF图块逐块读取和解码
+    无压缩和 Deflate 压缩（含水平差分预测）由 NumPy 直接解码；LZW、JPEG 等其他压缩的图块
+    逐个包装成单条带 TIFF 交给 Pillow 解码（需要 Pillow 带 libtiff，官方 wheel 默认包含）
+    非分块的 TIFF 返回 None；分块但无法逐块读取（位深、平面配置等不支持）时打印警告并返回 None，由调用方整图解码
+    """
+    tags = image.tag_v2
+    if _TIFF_TILE_OFFSETS not in tags:
+        return None
+    path = image.filename
+    channels = tags.get(_TIFF_SAMPLES_PER_PIXEL, 1)
+    bits = tags.get(_TIFF_BITS_PER_SAMPLE, (8,))
+    compression = tags.get(_TIFF_COMPRESSION, _TIFF_NO_COMPRESSION)
+    photometric = tags.get(_TIFF_PHOTOMETRIC)
+    predictor = tags.get(_TIFF_PREDICTOR, 1)
+    if (tags.get(_TIFF_PLANAR_CONFIG, 1) != 1 or channels not in (3, 4) or any(b != 8 for b in np.atleast_1d(bits))
+            or photometric not in (_TIFF_RGB, _TIFF_YCBCR) or (photometric == _TIFF_YCBCR and compression != _TIFF_JPEG)):
+        print(f"警告: {path} 的分块格式不支持逐块读取（只支持交错存储的 8 位RGB），将整图解码")
+        return None
+
+    width, height = image.size
+    tile_width, tile_height = tags[_TIFF_TILE_WIDTH], tags[_TIFF_TILE_LENGTH]
+    offsets, byte_counts = tags[_TIFF_TILE_OFFSETS], tags[_TIFF_TILE_BYTE_COUNTS]
+    tiles_across = (width + tile_width - 1) // tile_width
+    numpy_decode = compression == _TIFF_NO_COMPRESSION or (compression in _TIFF_DEFLATE and predictor in (1, 2))
+
+    # Pillow 解码时每个图块使用的 TIFF 字段（预测、JPEG 量化表等由 libtiff 处理）
+    fields = [(_TIFF_IMAGE_WIDTH, 4, [tile_width]), (_TIFF_IMAGE_LENGTH, 4, [tile_height]),
+              (_TIFF_BITS_PER_SAMPLE, 3, [8] * channels), (_TIFF_COMPRESSION, 3, [compression]),
+              (_TIFF_PHOTOMETRIC, 3, [photometric]), (_TIFF_SAMPLES_PER_PIXEL, 3, [channels]),
+              (_TIFF_ROWS_PER_STRIP, 4, [tile_height]), (_TIFF_PLANAR_CONFIG, 3, [1]), (_TIFF_PREDICTOR, 3, [predictor])]
+    if channels == 4:
+        fields.append((_TIFF_EXTRA_SAMPLES, 3, list(np.atleast_1d(tags.get(_TIFF_EXTRA_SAMPLES, 0)))))
+    if _TIFF_JPEG_TABLES in tags:
+        fields.append((_TIFF_JPEG_TABLES, 7, tags[_TIFF_JPEG_TABLES]))
+    if _TIFF_YCBCR_SUBSAMPLING in tags:
+        fields.append((_TIFF_YCBCR_SUBSAMPLING, 3, list(tags[_TIFF_YCBCR_SUBSAMPLING])))
+
+    def load_tile(tile_row, tile_col):
+        index = tile_row * tiles_across + tile_col
+        # 边缘图块在文件中同样按完整的图块尺寸存储
+        with open(path, 'rb') as f:
+            f.seek(offsets[index])
+            data = f.read(byte_counts[index])
+        if numpy_decode:
+            if compression in _TIFF_DEFLATE:
+                data = zlib.decompress(data)
+            tile = np.frombuffer(data, dtype=np.uint8, count=tile_width * tile_height * channels)
+            tile = tile.reshape(tile_height, tile_width, channels)
+            if predictor == 2:
+                tile = np.cumsum(tile, axis=1, dtype=np.uint8)  # 按通道的水平差分，模 256 累加
+        else:
+            with Image.open(io.BytesIO(_single_strip_tiff(fields, data))) as decoded:
+                tile = np.asarray(decoded if decoded.mode in ('RGB', 'RGBA') else decoded.convert('RGB'))
+        rows = min(tile_height, height - tile_row * tile_height)
+        cols = min(tile_width, width - tile_col * tile_width)
+        return tile[:rows, :cols]
+
+    row_edges = np.minimum(np.arange(0, height + tile_height, tile_height), height)
+    col_edges = np.minimum(np.arange(0, width + tile_width, tile_width), width)
+    try:
+        # 构造时会解码第一个图块，Pillow 不支持该压缩方式时在这里失败
+        return TileMosaic(load_tile, np.unique(row_edges), np.unique(col_edges), max_cache_bytes)
+    except (OSError, ValueError) as e:
+        print(f"警告: 无法逐块解码 {path}（压缩方式 {compression}: {e}），将整图解码")
+        return None